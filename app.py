@@ -7,19 +7,23 @@ import logging
 import signal
 import sys
 import traceback
-from typing import List
+from functools import partial
+from typing import Any, Dict, List
 
 # Проверяем платформу для обработки сигналов
 import platform
 IS_WINDOWS = platform.system() == 'Windows'
 
-from vk_api.bot_longpoll import VkBotLongPoll, VkBotEventType
-import vk_api
-
 from config.settings import config
+from handlers.deduplicator import EventDeduplicator
+from handlers.dispatcher import EventDispatcher, get_event_message, get_event_user_id
 from handlers.message_handler import MessageHandler
+from services.callback_service import CallbackServer
+from services.checkpoint_service import LongPollCheckpoint
+from services.longpoll_service import LongPollService
+from services.send_queue import PRIORITY_NOTICE
 from services.service_factory import ServiceFactory
-from utils import setup_logging
+from utils import EventRecorder, VKAPIError, setup_logging
 
 # Настройка логирования
 setup_logging(config.LOG_LEVEL, 'vkinder_bot.log')
@@ -27,18 +31,59 @@ setup_logging(config.LOG_LEVEL, 'vkinder_bot.log')
 logger = logging.getLogger(__name__)
 
 class VKinderBot:
-    def __init__(self):
+    def __init__(self, mode: str = None):
         self.logger = logging.getLogger(__name__)
         self.is_running = False
         
-        # Инициализация VK API
-        try:
-            self.vk_session = vk_api.VkApi(token=config.VK.GROUP_TOKEN)
-            self.longpoll = VkBotLongPoll(self.vk_session, config.VK.GROUP_ID)
-            self.logger.info("VK API инициализирован успешно")
-        except Exception as e:
-            self.logger.error(f"Ошибка инициализации VK API: {e}")
-            raise
+        # longpoll, callback или worker (события приходят от supervisor.py)
+        self.mode = mode or config.BOT.MODE
+        self.stop_event = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.shutting_down = False
+        # Фоновые задачи (например, ответы о перегрузке), которые нужно дождаться при остановке
+        self.background_tasks = set()
+        
+        # События одного пользователя - по порядку, разных - параллельно
+        self.dispatcher = EventDispatcher(
+            self.handle_message,
+            max_concurrency=config.BOT.MAX_CONCURRENCY,
+            high_watermark=config.BOT.QUEUE_HIGH_WATERMARK,
+            low_watermark=config.BOT.QUEUE_LOW_WATERMARK,
+            max_pending=config.BOT.QUEUE_MAX_SIZE,
+            on_reject=self.reject_event
+        )
+        self.stats_task = None
+        # Проверка токенов VK идет в фоне, не задерживая запуск
+        self.validation_task = None
+        
+        # Повторные доставки VK и двойные нажатия отсекаем до постановки в очередь
+        self.deduplicator = EventDeduplicator(
+            event_window=config.BOT.DEDUP_WINDOW,
+            payload_window=config.BOT.PAYLOAD_DEDUP_WINDOW
+        )
+        
+        if self.mode == 'callback':
+            # Callback API: VK присылает события POST-запросами, отвечаем "ok" сразу
+            self.longpoll = None
+            self.callback_server = CallbackServer(self.ingest, health=self.health)
+        elif self.mode == 'worker':
+            # Прием событий выполняет процесс-супервизор
+            self.longpoll = None
+            self.callback_server = None
+        else:
+            # Асинхронный long poll: ожидание ответа сервера не блокирует цикл событий
+            self.longpoll = LongPollService(config.VK.GROUP_TOKEN, config.VK.GROUP_ID)
+            self.callback_server = None
+        
+        # Запись входящих событий для benchmarks/replay.py
+        self.recorder = None
+        if config.BOT.RECORD_FILE:
+            self.recorder = EventRecorder(config.BOT.RECORD_FILE, record_responses=config.BOT.RECORD_API_RESPONSES)
+        
+        # Позиция long poll переживает перезапуск: пропущенные события догоняем
+        self.checkpoint = None
+        if self.longpoll and config.BOT.CHECKPOINT_FILE:
+            self.checkpoint = LongPollCheckpoint(config.BOT.CHECKPOINT_FILE, config.BOT.CHECKPOINT_INTERVAL)
     
     async def startup(self):
         """Запускает приложение"""
@@ -50,14 +95,18 @@ class VKinderBot:
             db_repo = ServiceFactory.get_db_repository()
             self.logger.info("✅ База данных подключена успешно")
             
-            # Проверяем VK API
+            # Токены VK проверяются в фоне: события принимаются сразу,
+            # результат проверки - в health() и в логе
             vk_service = ServiceFactory.get_vk_service()
+            vk_service.recorder = self.recorder
+            self.validation_task = asyncio.create_task(self.validate_vk_tokens(vk_service))
             self.logger.info("✅ VK Service инициализирован успешно")
             
             # Инициализируем обработчик сообщений
             self.message_handler = MessageHandler()
             
             self.is_running = True
+            self.stats_task = asyncio.create_task(self.log_stats())
             self.logger.info("🤖 Бот запущен и готов к работе")
             
         except Exception as e:
@@ -67,10 +116,55 @@ class VKinderBot:
             raise
     
     async def shutdown(self):
-        """Корректно завершает работу приложения"""
+        """
+        Корректно завершает работу приложения: прекращает прием событий,
+        дожидается (не дольше BOT_SHUTDOWN_TIMEOUT) обработки принятых
+        и только потом останавливает сервисы и закрывает БД
+        """
+        if self.shutting_down:
+            # Остановка уже идет (например, из обработчика сигнала) - дожидаемся ее
+            await self.stopped.wait()
+            return
+        self.shutting_down = True
+        
         self.logger.info("🛑 Завершение работы бота...")
         self.is_running = False
+        self.stop_event.set()
+        
+        if self.stats_task:
+            self.stats_task.cancel()
+        if self.validation_task:
+            self.validation_task.cancel()
         
+        # 1. Прекращаем прием новых событий
+        try:
+            if self.longpoll:
+                await self.longpoll.close()
+            if self.callback_server:
+                await self.callback_server.stop()
+        except Exception as e:
+            self.logger.error(f"Ошибка при остановке приема событий: {e}")
+        
+        # 2. Дожидаемся обработки уже принятых событий и фоновых отправок
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + config.BOT.SHUTDOWN_TIMEOUT
+            lost = await self.dispatcher.drain(config.BOT.SHUTDOWN_TIMEOUT)
+            if self.background_tasks:
+                await asyncio.wait(self.background_tasks, timeout=max(0.0, deadline - loop.time()))
+            if lost:
+                self.logger.warning(f"⚠️ При остановке не обработано событий: {lost}")
+            else:
+                self.logger.info("✅ Все принятые события обработаны")
+        except Exception as e:
+            self.logger.error(f"Ошибка при ожидании обработки событий: {e}")
+        
+        if self.checkpoint:
+            await self.checkpoint.close()
+        if self.recorder:
+            self.recorder.close()
+        
+        # 3. Останавливаем сервисы и закрываем соединение с БД
         try:
             await ServiceFactory.shutdown()
             self.logger.info("✅ Сервисы корректно остановлены")
@@ -78,26 +172,43 @@ class VKinderBot:
             self.logger.error(f"Ошибка при остановке сервисов: {e}")
         
         self.logger.info("👋 Бот завершил работу")
+        self.stopped.set()
+    
+    async def validate_vk_tokens(self, vk_service):
+        """Проверяет токены VK (все одновременно, не дольше VK_TOKEN_CHECK_TIMEOUT)"""
+        try:
+            await vk_service.validate_tokens(config.VK.TOKEN_CHECK_TIMEOUT)
+        except VKAPIError as e:
+            self.logger.error(f"❌ {e}: бот принимает события, но запросы к VK не пройдут")
+            return
+        except Exception as e:
+            self.logger.error(f"Ошибка проверки токенов VK: {e}")
+            return
+
+        health = vk_service.health()
+        if health['status'] == 'ok':
+            self.logger.info("✅ Токены VK действительны")
+        else:
+            self.logger.warning(f"⚠️ Токены VK: {health['status']}, {health['tokens']}")
+    
+    def health(self) -> Dict[str, Any]:
+        """
+        Состояние бота: starting/stopping - запуск или остановка, иначе
+        состояние токенов VK (ok, starting, degraded, failed)
+        """
+        if not self.is_running:
+            return {'status': 'stopping' if self.shutting_down else 'starting'}
+        return ServiceFactory.get_vk_service().health()
     
     async def handle_message(self, event):
         """Обрабатывает входящее сообщение"""
         try:
-            message_data = event.obj.message
-            user_id = message_data['from_id']
-            message_text = message_data['text']
-            payload = message_data.get('payload')
-            
-            self.logger.info(f"📩 Сообщение от {user_id}: {message_text}")
-            if payload:
-                self.logger.info(f"📦 Payload: {payload}")
-            
             # Создаем словарь с данными сообщения для передачи в обработчик
-            message_dict = {
-                'id': message_data.get('id'),
-                'from_id': user_id,
-                'text': message_text,
-                'payload': payload
-            }
+            message_dict = get_event_message(event)
+            
+            self.logger.info(f"📩 Сообщение от {message_dict['from_id']}: {message_dict['text']}")
+            if message_dict['payload']:
+                self.logger.info(f"📦 Payload: {message_dict['payload']}")
             
             # Передаем словарь в обработчик сообщений
             await self.message_handler.handle_message(message_dict)
@@ -106,6 +217,135 @@ class VKinderBot:
             self.logger.error(f"Ошибка обработки сообщения: {e}")
             self.logger.error(f"Трассировка: {traceback.format_exc()}")
     
+    def ingest(self, event, on_done=None, sheddable: bool = True) -> bool:
+        """
+        Принимает событие из long poll или Callback API.
+        on_done вызывается, когда событие обработано или отброшено
+        """
+        if self.recorder:
+            self.recorder.record_event(event)
+        if self.deduplicator.is_duplicate(event):
+            if on_done is not None:
+                on_done()
+            return False
+
+        def done():
+            # Такое же нажатие снова принимается, когда это обработано
+            self.deduplicator.finish_tap(event)
+            if on_done is not None:
+                on_done()
+
+        accepted = self.dispatcher.submit(event, done, sheddable)
+        if not accepted:
+            done()
+        return accepted
+    
+    def reject_event(self, event):
+        """Отвечает пользователю, чье событие сброшено из-за перегрузки"""
+        user_id = get_event_user_id(event)
+        if user_id is not None:
+            task = asyncio.create_task(self.send_busy_reply(user_id))
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+    
+    async def send_busy_reply(self, user_id: int):
+        """Отправляет короткое сообщение о перегрузке"""
+        try:
+            await ServiceFactory.get_vk_service().send_message(
+                user_id,
+                "⏳ Бот сейчас перегружен, попробуйте еще раз через несколько секунд",
+                priority=PRIORITY_NOTICE
+            )
+        except Exception as e:
+            self.logger.error(f"Ошибка отправки сообщения о перегрузке: {e}")
+    
+    async def log_stats(self):
+        """Периодически пишет в лог метрики диспетчера"""
+        while self.is_running:
+            await asyncio.sleep(config.BOT.STATS_INTERVAL)
+            stats = self.dispatcher.get_stats(top=3)
+            stats.update(self.deduplicator.get_stats())
+            self.logger.info(
+                f"📊 Очередь: {stats['pending']}, в обработке: {stats['in_flight']}/{stats['max_concurrency']}, "
+                f"шардов: {stats['active_shards']}, макс. задержка: {stats['max_lag']:.2f}с, "
+                f"сброшено: {stats['rejected']}, схлопнуто: {stats['coalesced']}, "
+                f"повторов: {stats['duplicates'] + stats['repeated_taps']}"
+            )
+            vk_service = ServiceFactory.get_vk_service()
+            # Города, найденные через VK, сохраняются здесь, а не после каждого запроса
+            await vk_service.city_resolver.flush()
+            vk_stats = vk_service.get_stats()
+            health = vk_service.health()
+            if health['status'] not in ('ok', 'starting'):
+                self.logger.warning(f"⚠️ Состояние: {health['status']}, токены VK: {health['tokens']}")
+            self.logger.info(
+                f"📊 VK API: users.get - {vk_stats['users_get']['requested']} пользователей "
+                f"за {vk_stats['users_get']['batches']} запросов, объединено одинаковых вызовов: "
+                f"{vk_stats['single_flight']['shared']}/{vk_stats['single_flight']['calls']} "
+                f"({vk_stats['single_flight']['ratio']:.0%})"
+            )
+            self.logger.info("📊 Лимиты VK API: " + ", ".join(
+                f"{name} - {limit['acquired']} запросов, ждали {limit['delayed']} ({limit['waited']:.1f}с)"
+                for name, limit in vk_stats['rate_limits'].items()
+            ))
+            if vk_stats['concurrency']:
+                self.logger.info("📊 Одновременных вызовов VK (лимит): " + ", ".join(
+                    f"{method} - {limit['in_flight']}/{limit['limit']}"
+                    for method, limit in sorted(vk_stats['concurrency'].items())
+                ))
+            if len(vk_stats['user_tokens']) > 1:
+                self.logger.info("📊 Токены пользователя: " + ", ".join(
+                    f"{name} - {token['calls']} вызовов, ошибок {token['errors']} ({token['state']})"
+                    for name, token in vk_stats['user_tokens'].items()
+                ))
+            if vk_stats['send_queue'] is not None:
+                send_stats = vk_stats['send_queue']
+                self.logger.info(
+                    f"📊 Отправка: в очереди {send_stats['queued']}, отправлено {send_stats['sent']}, "
+                    f"ошибок {send_stats['failed']}, повторов {send_stats['retried']}, "
+                    f"макс. ожидание {send_stats['max_wait']:.2f}с, склеено сообщений: {vk_stats['coalesced']}"
+                )
+    
+    async def run_longpoll(self):
+        """Получает события через long poll"""
+        if self.checkpoint:
+            saved = self.checkpoint.load()
+            if saved and saved.get('ts'):
+                for event_id in saved.get('handled', []):
+                    self.deduplicator.mark_handled(event_id)
+                self.longpoll.resume_from(saved['ts'])
+            self.checkpoint.start()
+        
+        while self.is_running:
+            try:
+                async for ts, events in self.longpoll.listen_batches():
+                    catching_up = self.longpoll.catching_up
+                    batch_id = self.checkpoint.start_batch(ts, len(events)) if self.checkpoint else None
+                    
+                    for event in events:
+                        on_done = None
+                        if self.checkpoint:
+                            on_done = partial(self.checkpoint.complete, batch_id, event.get('event_id'))
+                        # Пропущенные события не сбрасываем, а ограничиваем скорость их получения
+                        self.ingest(event, on_done, sheddable=not catching_up)
+                    
+                    if catching_up:
+                        await self.dispatcher.wait_for_capacity(config.BOT.QUEUE_LOW_WATERMARK)
+                    
+                    # Проверяем флаг running после каждой итерации
+                    if not self.is_running:
+                        break
+            
+            except Exception as e:
+                self.logger.error(f"Ошибка в основном цикле: {e}")
+                self.logger.error(f"Трассировка: {traceback.format_exc()}")
+                await asyncio.sleep(5)  # Пауза перед повторной попыткой
+    
+    async def run_callback(self):
+        """Получает события через Callback API до остановки бота"""
+        await self.callback_server.start()
+        await self.stop_event.wait()
+    
     async def run(self):
         """Основной цикл работы бота"""
         try:
@@ -127,20 +367,10 @@ class VKinderBot:
             self.logger.info("🖥️ Запущено на Windows - для остановки используйте Ctrl+C")
         
         try:
-            while self.is_running:
-                try:
-                    for event in self.longpoll.listen():
-                        if event.type == VkBotEventType.MESSAGE_NEW:
-                            await self.handle_message(event)
-                        
-                        # Проверяем флаг running после каждой итерации
-                        if not self.is_running:
-                            break
-                
-                except Exception as e:
-                    self.logger.error(f"Ошибка в основном цикле: {e}")
-                    self.logger.error(f"Трассировка: {traceback.format_exc()}")
-                    await asyncio.sleep(5)  # Пауза перед повторной попыткой
+            if self.mode == 'callback':
+                await self.run_callback()
+            else:
+                await self.run_longpoll()
                     
         except asyncio.CancelledError:
             self.logger.info("Работа бота прервана")
@@ -148,8 +378,7 @@ class VKinderBot:
             self.logger.error(f"Неожиданная ошибка в основном цикле: {e}")
             self.logger.error(f"Трассировка: {traceback.format_exc()}")
         finally:
-            if self.is_running:
-                await self.shutdown()
+            await self.shutdown()
 
 async def main():
     """Точка входа приложения"""
@@ -0,0 +1,3 @@
+"""
+Инструменты измерения производительности VKinder Bot
+"""
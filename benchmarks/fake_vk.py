@@ -0,0 +1,144 @@
+"""
+Заглушка VK API для воспроизведения событий и нагрузочных тестов
+"""
+
+import asyncio
+import re
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from config.settings import config
+from services.async_vk_service import AsyncVKService
+from services.city_resolver import CityResolver
+from services.vk_rate_limits import VKRateLimits
+from services.vk_client import prepare_params
+from utils import VKAPIError
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань']
+
+
+class FakeVKClient:
+    """
+    Отвечает на вызовы VK API вместо api.vk.com (интерфейс AsyncVKClient).
+
+    Ответы детерминированы и зависят от id пользователя; задержка каждого
+    метода задается в latencies (секунды) - например, медианы из записанного
+    трафика - и выдерживается через asyncio.sleep.
+    """
+
+    def __init__(self, latencies: Optional[Dict[str, float]] = None,
+                 candidates_per_page: int = 30, photoless_share: int = 5):
+        self.latencies = latencies or {}
+        self.candidates_per_page = candidates_per_page
+        # Каждый photoless_share-й кандидат без фотографий
+        self.photoless_share = photoless_share
+        self.calls = Counter()
+
+    async def call(self, method: str, params: Dict[str, Any], token: str,
+                   timeout: Optional[float] = None) -> Any:
+        self.calls[method] += 1
+        delay = self.latencies.get(method, 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        handler = getattr(self, '_' + method.replace('.', '_'), None)
+        if handler is None:
+            raise VKAPIError(f"VK API error in {method}: Unknown method passed", 3)
+        return handler(prepare_params(params))
+
+    async def close(self) -> None:
+        pass
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        age = 18 + user_id % 40
+        city_index = user_id % len(CITIES)
+        return {
+            'id': user_id,
+            'first_name': f'User{user_id}',
+            'last_name': 'Test',
+            'bdate': f'1.1.{date.today().year - age}',
+            'city': {'id': city_index + 1, 'title': CITIES[city_index]},
+            'sex': 1 + user_id % 2,
+            'domain': f'id{user_id}'
+        }
+
+    def _photos(self, user_id: int) -> List[Dict[str, Any]]:
+        if self.photoless_share and user_id % self.photoless_share == 0:
+            return []
+        return [{'id': n, 'owner_id': user_id, 'likes': {'count': 100 - n}} for n in range(5)]
+
+    def _users_get(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [self._user(int(user_id)) for user_id in str(params['user_ids']).split(',')]
+
+    def _groups_getById(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{'id': 1, 'name': 'VKinder'}]
+
+    def _database_getCities(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        query = str(params.get('q', '')).lower()
+        items = [
+            {'id': index + 1, 'title': name}
+            for index, name in enumerate(CITIES) if name.lower().startswith(query)
+        ]
+        items = items[:int(params.get('count', 100))]
+        return {'count': len(items), 'items': items}
+
+    def _users_search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        offset = int(params.get('offset', 0))
+        base = int(params['city']) * 10_000_000 + int(params['age_from']) * 100_000 + int(params['sex']) * 10_000
+        items = [
+            {
+                'id': base + offset + i,
+                'first_name': f'Candidate{offset + i}',
+                'last_name': 'Test',
+                'domain': f'id{base + offset + i}',
+                'is_closed': False,
+                'can_access_closed': True
+            }
+            for i in range(min(self.candidates_per_page, int(params.get('count', 100))))
+        ]
+        return {'count': 1000, 'items': items}
+
+    def _photos_get(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        items = self._photos(int(params['owner_id']))
+        return {'count': len(items), 'items': items}
+
+    def _execute(self, params: Dict[str, Any]) -> List[Any]:
+        # Поддерживается только код из VKService._photos_execute_code
+        match = re.search(r'var ids = \[([\d,]*)\]', params['code'])
+        if not match:
+            raise VKAPIError("VK API error in execute: unsupported code", 12)
+        result = []
+        for user_id in filter(None, match.group(1).split(',')):
+            photos = self._photos(int(user_id))
+            result.append({'ids': [p['id'] for p in photos], 'likes': [p['likes'] for p in photos]})
+        return result
+
+    def _messages_send(self, params: Dict[str, Any]) -> int:
+        return self.calls['messages.send']
+
+
+class FakeVKService(AsyncVKService):
+    """
+    AsyncVKService поверх FakeVKClient: кэши и пакетные запросы работают как в боте.
+    Города, найденные в заглушке, не попадают в VK_CITY_CACHE_FILE бота;
+    лимиты частоты VK выключены (rate_limits=True - как в настройках),
+    чтобы задержки показывали сам бот, а не ожидание лимитов
+    """
+
+    def __init__(self, latencies: Optional[Dict[str, float]] = None,
+                 candidates_per_page: int = 30, photoless_share: int = 5,
+                 rate_limits: bool = False):
+        super().__init__(client=FakeVKClient(latencies, candidates_per_page, photoless_share))
+        self.city_resolver = CityResolver(cache_file=None, negative_ttl=config.VK.CITY_NEGATIVE_TTL)
+        if not rate_limits:
+            if self.rate_limits.backend is not None:
+                self.rate_limits.backend.close()
+            self.rate_limits = VKRateLimits()
+            if self.send_queue is not None:
+                self.send_queue.limiter = None
+
+    @property
+    def calls(self) -> Counter:
+        """Число вызовов каждого метода VK API"""
+        return self.client.calls
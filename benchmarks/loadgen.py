@@ -0,0 +1,324 @@
+"""
+Нагрузочный тест: тысячи виртуальных пользователей
+
+Каждый виртуальный пользователь проходит типичный путь по FSM бота
+(начать -> пол/возраст/город -> поиск -> лайки/дизлайки/пропуски ->
+избранные -> главное меню) и ждет ответа на свое событие, прежде чем
+отправить следующее. События идут через тот же прием, что и в боте
+(VKinderBot.ingest: отсечение повторов, диспетчер со сбросом нагрузки).
+VK API заменен FakeVKService, БД - MockDatabaseRepository или локальный
+PostgreSQL из настроек .env (--db postgres).
+
+Пользователи добавляются равномерно в течение --ramp секунд; по окнам
+--window секунд выводятся предлагаемая нагрузка, пропускная способность
+и задержки, по ним определяется точка насыщения.
+
+python -m benchmarks.loadgen --users 2000 --ramp 60 --duration 120
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app import VKinderBot
+from benchmarks.fake_vk import CITIES, FakeVKService
+from benchmarks.stats import CallCounter, LatencyStats, format_counts, format_histogram, percentile
+from database.mock_repository import MockDatabaseRepository
+from services.service_factory import ServiceFactory
+
+# Задержки VK API по умолчанию (секунды) - порядок величин из записанного трафика
+DEFAULT_LATENCIES = {
+    'users.get': 0.05,
+    'database.getCities': 0.05,
+    'users.search': 0.15,
+    'photos.get': 0.08,
+    'messages.send': 0.05
+}
+
+AGE_RANGES = ['18-25', '26-35', '36-45', '46+']
+
+# Шаг сценария: (текст сообщения, payload или None)
+Step = Tuple[str, Optional[Dict[str, Any]]]
+
+
+class VirtualUser:
+    """Сценарий поведения одного виртуального пользователя"""
+
+    def __init__(self, user_id: int, rng: random.Random):
+        self.user_id = user_id
+        self.rng = rng
+        self.sessions = 0
+
+    def session(self) -> Iterator[Step]:
+        """Шаги одной сессии; настройки меняются в первой сессии и изредка потом"""
+        self.sessions += 1
+        yield 'Начать', None
+
+        if self.sessions == 1 or self.rng.random() < 0.1:
+            yield 'Пол', {'command': 'sex'}
+            yield 'Пол выбран', {'sex': self.rng.choice([1, 2])}
+            yield 'Возраст', {'command': 'age'}
+            yield 'Возраст выбран', {'command': 'age_selected', 'age_range': self.rng.choice(AGE_RANGES)}
+            yield 'Город', {'command': 'city'}
+            yield 'Город выбран', {'command': 'city_selected', 'city': self.rng.choice(CITIES)}
+
+        yield '🔍 Найти человека', {'command': 'search'}
+        for _ in range(self.rng.randint(5, 20)):
+            command = self.rng.choices(['like', 'dislike', 'skip'], weights=[3, 5, 2])[0]
+            yield command, {'command': command}
+
+        yield '⭐ Избранные', {'command': 'favorites'}
+        yield '🏠 Главное меню', {'command': 'main_menu'}
+
+
+class LoadGenerator:
+    """Запускает виртуальных пользователей и собирает статистику по окнам времени"""
+
+    def __init__(self, bot, users: int, ramp: float, duration: float,
+                 think_time: float, reply_timeout: float, window: float, seed: int = 0):
+        self.bot = bot
+        self.users = users
+        self.ramp = ramp
+        self.duration = duration
+        self.think_time = think_time
+        self.reply_timeout = reply_timeout
+        self.window = window
+        self.rng = random.Random(seed)
+
+        self.stats = LatencyStats()
+        self.all_latencies: List[float] = []
+        self.windows: List[Dict[str, Any]] = []
+
+        self.active_users = 0
+        self.sent = 0
+        self.completed = 0
+        self.dropped = 0
+        self.timeouts = 0
+        self._window_latencies: List[float] = []
+        self._next_event_id = 0
+        self._started = 0.0
+        self.elapsed = 0.0
+        self.dedup_stats: Dict[str, int] = {}
+        self.dispatcher_stats: Dict[str, Any] = {}
+
+    def _build_event(self, user_id: int, text: str, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Формирует событие message_new в формате Bots Long Poll"""
+        self._next_event_id += 1
+        message = {
+            'date': int(time.time()),
+            'from_id': user_id,
+            'id': self._next_event_id,
+            'out': 0,
+            'peer_id': user_id,
+            'text': text,
+            'conversation_message_id': self._next_event_id
+        }
+        if payload is not None:
+            message['payload'] = json.dumps(payload)
+        return {
+            'group_id': 1,
+            'type': 'message_new',
+            'event_id': f"{self._next_event_id:040x}",
+            'v': '5.131',
+            'object': {'message': message, 'client_info': {'keyboard': True, 'inline_keyboard': True}}
+        }
+
+    async def _send(self, user_id: int, text: str, payload: Optional[Dict[str, Any]]) -> None:
+        """Отправляет событие и ждет его обработки, как пользователь ждет ответа"""
+        command = (payload or {}).get('command') or ('sex_selected' if payload else 'text')
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        submitted = time.perf_counter()
+
+        def on_done():
+            if not done.done():
+                done.set_result(time.perf_counter() - submitted)
+
+        self.sent += 1
+        if not self.bot.ingest(self._build_event(user_id, text, payload), on_done):
+            # Повтор отсечен или событие сброшено из-за перегрузки
+            self.dropped += 1
+            return
+
+        try:
+            latency = await asyncio.wait_for(done, self.reply_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return
+
+        self.completed += 1
+        self.stats.add(command, latency)
+        self.all_latencies.append(latency)
+        self._window_latencies.append(latency)
+
+    async def _run_user(self, user: VirtualUser, deadline: float) -> None:
+        self.active_users += 1
+        try:
+            while time.monotonic() < deadline:
+                for text, payload in user.session():
+                    pause = self.rng.expovariate(1 / self.think_time)
+                    if time.monotonic() + pause >= deadline:
+                        return
+                    await asyncio.sleep(pause)
+                    await self._send(user.user_id, text, payload)
+        finally:
+            self.active_users -= 1
+
+    async def _sample(self) -> None:
+        """Раз в window секунд сохраняет показатели за прошедшее окно"""
+        sent = completed = dropped = 0
+        previous = self._started
+        while True:
+            await asyncio.sleep(self.window)
+            # Заблокированный цикл событий растягивает окно - делим на фактическую длительность
+            now = time.monotonic()
+            interval = now - previous
+            previous = now
+            latencies = sorted(self._window_latencies)
+            self._window_latencies = []
+            self.windows.append({
+                't': now - self._started,
+                'users': self.active_users,
+                'offered': (self.sent - sent) / interval,
+                'throughput': (self.completed - completed) / interval,
+                'dropped': self.dropped - dropped,
+                'pending': self.bot.dispatcher.pending,
+                'p50': percentile(latencies, 50) * 1000,
+                'p95': percentile(latencies, 95) * 1000
+            })
+            sent, completed, dropped = self.sent, self.completed, self.dropped
+
+    async def run(self) -> None:
+        self._started = time.monotonic()
+        deadline = self._started + self.duration
+        sampler = asyncio.create_task(self._sample())
+
+        tasks = []
+        for index in range(self.users):
+            # Равномерный набор пользователей в течение ramp секунд
+            delay = self._started + self.ramp * index / self.users - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            user = VirtualUser(1_000_000 + index, random.Random(self.rng.random()))
+            tasks.append(asyncio.create_task(self._run_user(user, deadline)))
+
+        await asyncio.gather(*tasks)
+        self.elapsed = time.monotonic() - self._started
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+
+    def saturation_point(self, slo_ms: float) -> Optional[Dict[str, Any]]:
+        """
+        Первое окно, в котором система перестала справляться: обработано
+        меньше 90% предложенной нагрузки или p95 превысил slo_ms
+        """
+        for row in self.windows:
+            if row['offered'] and (row['throughput'] < 0.9 * row['offered'] or row['p95'] > slo_ms):
+                return row
+        return None
+
+    def format_windows(self) -> str:
+        lines = [f"{'t, с':>7}{'польз.':>8}{'предл./с':>10}{'обраб./с':>10}{'сброшено':>10}"
+                 f"{'очередь':>9}{'p50, мс':>10}{'p95, мс':>10}"]
+        for row in self.windows:
+            lines.append(
+                f"{row['t']:>7.0f}{row['users']:>8}{row['offered']:>10.1f}{row['throughput']:>10.1f}"
+                f"{row['dropped']:>10}{row['pending']:>9}{row['p50']:>10.1f}{row['p95']:>10.1f}"
+            )
+        return '\n'.join(lines)
+
+
+async def run_load(args, vk_service, db_repository) -> LoadGenerator:
+    """Поднимает бота поверх заглушек и прогоняет нагрузку"""
+    ServiceFactory.configure(vk_service=vk_service, db_repository=db_repository)
+    bot = VKinderBot(mode='worker')
+    await bot.startup()
+
+    generator = LoadGenerator(
+        bot,
+        users=args.users,
+        ramp=args.ramp,
+        duration=args.duration,
+        think_time=args.think_time,
+        reply_timeout=args.reply_timeout,
+        window=args.window,
+        seed=args.seed
+    )
+    try:
+        await generator.run()
+    finally:
+        await bot.shutdown()
+    generator.dedup_stats = bot.deduplicator.get_stats()
+    generator.dispatcher_stats = bot.dispatcher.get_stats()
+    return generator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест VKinder Bot")
+    parser.add_argument('--users', type=int, default=1000, help="количество виртуальных пользователей")
+    parser.add_argument('--ramp', type=float, default=60, help="за сколько секунд подключить всех пользователей")
+    parser.add_argument('--duration', type=float, default=120, help="длительность теста, секунды")
+    parser.add_argument('--think-time', type=float, default=3.0, help="средняя пауза пользователя между действиями, секунды")
+    parser.add_argument('--reply-timeout', type=float, default=30.0, help="сколько пользователь ждет ответа, секунды")
+    parser.add_argument('--window', type=float, default=5.0, help="окно агрегации статистики, секунды")
+    parser.add_argument('--slo', type=float, default=1000.0, help="допустимый p95 задержки, мс")
+    parser.add_argument('--db', choices=['mock', 'postgres'], default='mock',
+                        help="MockDatabaseRepository или PostgreSQL из настроек .env")
+    parser.add_argument('--no-latency', action='store_true', help="не имитировать задержки VK API")
+    parser.add_argument('--rate-limits', action='store_true', help="соблюдать лимиты частоты VK из настроек")
+    parser.add_argument('--latency', action='append', default=[], metavar='METHOD=SEC',
+                        help="задержка метода VK API, например users.search=0.15")
+    parser.add_argument('--seed', type=int, default=0, help="зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    # Обработчики подробно логируют каждое сообщение - для замера оставляем только предупреждения
+    logging.getLogger().setLevel(logging.WARNING)
+
+    latencies = {} if args.no_latency else dict(DEFAULT_LATENCIES)
+    for item in args.latency:
+        method, _, value = item.partition('=')
+        latencies[method] = float(value)
+
+    vk_service = FakeVKService(latencies=latencies, rate_limits=args.rate_limits)
+    if args.db == 'postgres':
+        from database.repository import DatabaseRepository
+        db_repository = CallCounter(DatabaseRepository())
+    else:
+        db_repository = CallCounter(MockDatabaseRepository())
+
+    generator = asyncio.run(run_load(args, vk_service, db_repository))
+
+    print(f"Пользователей: {args.users}, событий: {generator.sent}, обработано: {generator.completed}, "
+          f"сброшено: {generator.dropped}, без ответа за {args.reply_timeout:.0f}с: {generator.timeouts}")
+    print(f"Средняя пропускная способность: {generator.completed / max(generator.elapsed, 1e-9):.1f} событий/сек")
+    print(f"Отсечено повторов: {generator.dedup_stats['duplicates']}, "
+          f"повторных нажатий: {generator.dedup_stats['repeated_taps']}, "
+          f"отклонено при перегрузке: {generator.dispatcher_stats['rejected']}, "
+          f"схлопнуто: {generator.dispatcher_stats['coalesced']}")
+    print()
+    print(generator.format_windows())
+    print()
+
+    saturation = generator.saturation_point(args.slo)
+    if saturation:
+        print(f"Точка насыщения: ~{saturation['users']} пользователей, "
+              f"{saturation['offered']:.1f} событий/сек предложено, "
+              f"{saturation['throughput']:.1f} обработано, p95 {saturation['p95']:.0f} мс (t={saturation['t']:.0f}с)")
+    else:
+        print(f"Насыщение не достигнуто: p95 в пределах {args.slo:.0f} мс при {args.users} пользователях")
+    print()
+    print(generator.stats.format_table())
+    print()
+    print("Распределение задержек:")
+    print(format_histogram(generator.all_latencies))
+    print()
+    print(format_counts("Вызовы VK API", vk_service.calls))
+    print(format_counts("Вызовы БД", db_repository.calls))
+
+
+if __name__ == "__main__":
+    main()
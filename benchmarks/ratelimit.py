@@ -0,0 +1,164 @@
+"""
+Проверка общего для процессов лимита частоты запросов
+
+Запускает несколько процессов, каждый из которых без пауз запрашивает
+разрешения у лимитера с одним и тем же ключом, и считает, сколько
+разрешений выдано за каждую секунду всем процессам вместе. С хранилищем
+file лимит соблюдается для всех процессов, с local - только в каждом.
+С --threads каждый процесс запрашивает разрешения у хранилища file из
+нескольких потоков сразу (как из пула потоков цикла событий).
+
+python -m benchmarks.ratelimit --processes 8 --rps 20 --duration 5
+python -m benchmarks.ratelimit --processes 2 --threads 16 --rps 20 --duration 5
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import tempfile
+import threading
+import time
+from typing import List
+
+from utils import RateLimiter, SharedRateLimiter, create_rate_limit_backend
+
+
+async def hammer(backend_name: str, directory: str, rps: float, burst: int,
+                 concurrency: int, started: float, deadline: float) -> List[float]:
+    """Выдает разрешения с started до deadline и возвращает моменты их получения (monotonic)"""
+    backend = create_rate_limit_backend(backend_name, directory)
+    if backend is None:
+        limiter = RateLimiter(rps, 1.0, burst)
+    else:
+        limiter = SharedRateLimiter(backend, 'benchmark', rps, 1.0, burst)
+
+    granted = []
+    await asyncio.sleep(max(0.0, started - time.monotonic()))
+
+    async def worker() -> None:
+        while True:
+            await limiter.acquire()
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            granted.append(now)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    if backend is not None:
+        backend.close()
+    return granted
+
+
+def hammer_threads(directory: str, rps: float, burst: int, threads: int,
+                   started: float, deadline: float) -> List[float]:
+    """То же, что hammer, но потоки вызывают FileRateLimitBackend.reserve_sync напрямую"""
+    backend = create_rate_limit_backend('file', directory)
+    interval = 1.0 / rps
+    tolerance = (max(1, burst) - 1) * interval
+    granted = []
+    time.sleep(max(0.0, started - time.monotonic()))
+
+    def worker() -> None:
+        while True:
+            time.sleep(backend.reserve_sync('benchmark', interval, tolerance))
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            granted.append(now)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    backend.close()
+    return granted
+
+
+def lost_updates(directory: str, threads: int, calls: int) -> int:
+    """
+    Потоки без пауз резервируют по calls слотов длиной 1с; если каждое
+    резервирование учтено, tat сдвинулся на threads * calls секунд.
+    Возвращает, сколько резервирований потерялось
+    """
+    backend = create_rate_limit_backend('file', directory)
+    reserve = lambda: backend.reserve_sync('consistency', 1.0, 0.0)
+
+    def worker() -> None:
+        for _ in range(calls):
+            reserve()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    # Следующее резервирование ждет конца всех учтенных слотов
+    reserved = reserve()
+    backend.close()
+    return threads * calls - round(reserved)
+
+
+def process_main(queue: multiprocessing.Queue, backend_name: str, directory: str, rps: float,
+                 burst: int, concurrency: int, threads: int, started: float, deadline: float) -> None:
+    if threads:
+        queue.put(hammer_threads(directory, rps, burst, threads, started, deadline))
+    else:
+        queue.put(asyncio.run(hammer(backend_name, directory, rps, burst, concurrency, started, deadline)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка общего лимита частоты запросов")
+    parser.add_argument('--processes', type=int, default=8, help="количество процессов")
+    parser.add_argument('--concurrency', type=int, default=16, help="одновременных запросов в процессе")
+    parser.add_argument('--rps', type=float, default=20, help="лимит, запросов в секунду")
+    parser.add_argument('--burst', type=int, default=1, help="запросов подряд без интервала")
+    parser.add_argument('--duration', type=float, default=5, help="длительность, секунды")
+    parser.add_argument('--backend', choices=['file', 'local'], default='file', help="хранилище лимита")
+    parser.add_argument('--threads', type=int, default=0,
+                        help="потоков в процессе, вызывающих хранилище file напрямую (0 - asyncio)")
+    args = parser.parse_args()
+    if args.threads:
+        args.backend = 'file'
+
+    directory = tempfile.mkdtemp(prefix='vkinder-ratelimit-')
+    queue = multiprocessing.Queue()
+    # Все процессы начинают и заканчивают одновременно
+    started = time.monotonic() + 0.5
+    deadline = started + args.duration
+
+    processes = [
+        multiprocessing.Process(
+            target=process_main,
+            args=(queue, args.backend, directory, args.rps, args.burst, args.concurrency,
+                  args.threads, started, deadline)
+        )
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    granted = sorted(t for _ in processes for t in queue.get())
+    for process in processes:
+        process.join()
+
+    per_second = [0] * int(args.duration + 1)
+    for moment in granted:
+        per_second[int(moment - started)] += 1
+    per_second = per_second[:int(args.duration)]
+
+    total = sum(per_second)
+    threads = f", потоков в процессе: {args.threads}" if args.threads else ''
+    print(f"Процессов: {args.processes}{threads}, хранилище: {args.backend}, лимит: {args.rps:g} запросов/сек")
+    print(f"Выдано разрешений: {total} за {args.duration:g}с, {total / args.duration:.1f}/сек")
+    print("По секундам: " + ' '.join(str(count) for count in per_second))
+    limit = args.rps + args.burst
+    exceeded = [count for count in per_second if count > limit]
+    print("Лимит соблюден" if not exceeded else f"Лимит превышен в {len(exceeded)} из {len(per_second)} секунд")
+
+    if args.threads:
+        lost = lost_updates(directory, args.threads, 250)
+        print(f"Потеряно резервирований при {args.threads} потоках: {lost} из {args.threads * 250}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Воспроизведение записанных событий через MessageHandler
+
+Гонит события из JSONL-файла EventRecorder (BOT_RECORD_FILE) через
+MessageHandler.handle_message с MockDatabaseRepository и FakeVKService
+так быстро, как позволяет обработка, и выводит события/сек, задержки
+по командам (p50/p95/p99) и число обращений к VK API и БД.
+
+python -m benchmarks.replay events.jsonl --concurrency 32
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.fake_vk import FakeVKService
+from benchmarks.stats import CallCounter, LatencyStats, format_counts
+from database.mock_repository import MockDatabaseRepository
+from handlers.dispatcher import EventDispatcher, get_event_command, get_event_message
+from handlers.message_handler import MessageHandler
+from services.service_factory import ServiceFactory
+from utils import read_records
+
+
+def load_recording(path: str) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Возвращает события и медианные задержки методов VK API из записи"""
+    events = []
+    latencies = defaultdict(list)
+    for record in read_records(path):
+        if record.get('type') == 'event':
+            events.append(record['event'])
+        elif record.get('type') == 'api' and not record.get('error'):
+            latencies[record['method']].append(record['latency'])
+
+    medians = {method: statistics.median(values) for method, values in latencies.items()}
+    return events, medians
+
+
+def build_handler(vk_service, db_repository) -> MessageHandler:
+    """Создает MessageHandler поверх заглушек VK и БД"""
+    ServiceFactory.configure(vk_service=vk_service, db_repository=db_repository)
+    return MessageHandler()
+
+
+async def replay(events: List[Dict[str, Any]], handler: MessageHandler,
+                 concurrency: int) -> Tuple[LatencyStats, float]:
+    """Прогоняет события через диспетчер и возвращает задержки и общее время"""
+    stats = LatencyStats()
+
+    async def process(event):
+        await handler.handle_message(get_event_message(event))
+
+    dispatcher = EventDispatcher(process, max_concurrency=concurrency)
+
+    def on_done(command, submitted):
+        stats.add(command, time.perf_counter() - submitted)
+
+    started = time.perf_counter()
+    for event in events:
+        command = get_event_command(event) or 'text'
+        submitted = time.perf_counter()
+        dispatcher.submit(event, lambda c=command, s=submitted: on_done(c, s), sheddable=False)
+    await dispatcher.drain(timeout=None)
+    return stats, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных событий VKinder Bot")
+    parser.add_argument('path', help="JSONL-файл, записанный EventRecorder")
+    parser.add_argument('--concurrency', type=int, default=32, help="максимум пользователей, обрабатываемых одновременно")
+    parser.add_argument('--repeat', type=int, default=1, help="сколько раз повторить запись")
+    parser.add_argument('--no-latency', action='store_true', help="не имитировать задержки VK API из записи")
+    parser.add_argument('--rate-limits', action='store_true', help="соблюдать лимиты частоты VK из настроек")
+    parser.add_argument('--latency', action='append', default=[], metavar='METHOD=SEC',
+                        help="задержка метода VK API, например users.search=0.15")
+    args = parser.parse_args()
+
+    # Обработчики подробно логируют каждое сообщение - для замера оставляем только предупреждения
+    logging.basicConfig(level=logging.WARNING)
+
+    events, latencies = load_recording(args.path)
+    if args.no_latency:
+        latencies = {}
+    for item in args.latency:
+        method, _, value = item.partition('=')
+        latencies[method] = float(value)
+
+    events = events * args.repeat
+    if not events:
+        print(f"В {args.path} нет событий")
+        return
+
+    vk_service = FakeVKService(latencies=latencies, rate_limits=args.rate_limits)
+    db_repository = CallCounter(MockDatabaseRepository())
+    handler = build_handler(vk_service, db_repository)
+
+    stats, elapsed = asyncio.run(replay(events, handler, args.concurrency))
+
+    print(f"Событий: {len(events)}, время: {elapsed:.2f}с, {len(events) / elapsed:.1f} событий/сек")
+    if latencies:
+        print("Задержки VK API: " + ', '.join(f"{m}={v * 1000:.0f}мс" for m, v in sorted(latencies.items())))
+    print()
+    print(stats.format_table())
+    print()
+    print(format_counts("Вызовы VK API", vk_service.calls))
+    print(format_counts("Вызовы БД", db_repository.calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Сбор и вывод статистики для replay.py и loadgen.py
+"""
+
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0-100) по отсортированному списку значений"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class LatencyStats:
+    """Задержки обработки, сгруппированные по команде"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, command: str, latency: float) -> None:
+        self.latencies[command].append(latency)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Возвращает {команда: {count, p50, p95, p99, max}} в миллисекундах"""
+        result = {}
+        for command, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            result[command] = {
+                'count': len(values),
+                'p50': percentile(values, 50) * 1000,
+                'p95': percentile(values, 95) * 1000,
+                'p99': percentile(values, 99) * 1000,
+                'max': values[-1] * 1000
+            }
+        return result
+
+    def format_table(self) -> str:
+        lines = [f"{'команда':<24}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}"]
+        for command, row in self.summary().items():
+            lines.append(
+                f"{command:<24}{row['count']:>8}{row['p50']:>10.1f}{row['p95']:>10.1f}"
+                f"{row['p99']:>10.1f}{row['max']:>10.1f}"
+            )
+        return '\n'.join(lines)
+
+
+class CallCounter:
+    """Прокси, подсчитывающий вызовы методов обернутого объекта"""
+
+    def __init__(self, target: Any):
+        self._target = target
+        self.calls = Counter()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+def format_counts(title: str, counts: Counter) -> str:
+    """Форматирует счетчик вызовов"""
+    total = sum(counts.values())
+    lines = [f"{title}: {total}"]
+    for name, count in counts.most_common():
+        lines.append(f"  {name:<32}{count:>8}")
+    return '\n'.join(lines)
+
+
+HISTOGRAM_BOUNDS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def format_histogram(latencies: List[float], width: int = 40) -> str:
+    """Гистограмма задержек (секунды) по логарифмическим корзинам"""
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies:
+        latency_ms = latency * 1000
+        for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if latency_ms < bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    peak = max(counts) or 1
+    labels = [f"< {bound} мс" for bound in HISTOGRAM_BOUNDS_MS] + [f">= {HISTOGRAM_BOUNDS_MS[-1]} мс"]
+    lines = []
+    for label, count in zip(labels, counts):
+        bar = '#' * round(count / peak * width)
+        lines.append(f"{label:>12} {count:>8} {bar}")
+    return '\n'.join(lines)
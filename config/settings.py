@@ -15,6 +15,14 @@ def safe_int(value, default=0):
         logger.warning(f"Не удалось преобразовать '{value}' в int, используется значение по умолчанию {default}")
         return default
 
+def safe_float(value, default=0.0):
+    """Безопасно преобразует в float"""
+    try:
+        return float(value) if value else default
+    except (ValueError, TypeError):
+        logger.warning(f"Не удалось преобразовать '{value}' в float, используется значение по умолчанию {default}")
+        return default
+
 @dataclass
 class DatabaseConfig:
     NAME: str = os.getenv('DB_NAME', 'vkinder_bot_vk')
@@ -26,17 +34,78 @@ class DatabaseConfig:
 @dataclass
 class VKConfig:
     USER_TOKEN: str = os.getenv('VK_USER_TOKEN')
+    USER_TOKENS: str = os.getenv('VK_USER_TOKENS', '')  # дополнительные токены пользователя через запятую
     GROUP_TOKEN: str = os.getenv('VK_GROUP_TOKEN')
     GROUP_ID: int = safe_int(os.getenv('VK_GROUP_ID'), 0)
     API_VERSION: str = '5.131'
     SEARCH_LIMIT: int = 100
     PHOTOS_LIMIT: int = 3
     MAX_AGE_DIFFERENCE: int = 5
+    API_TIMEOUT: float = safe_float(os.getenv('VK_API_TIMEOUT'), 10.0)  # таймаут одного вызова, секунды
+    HTTP_POOL_SIZE: int = safe_int(os.getenv('VK_HTTP_POOL_SIZE'), 100)  # соединений с api.vk.com
+    TOKEN_CHECK_TIMEOUT: float = safe_float(os.getenv('VK_TOKEN_CHECK_TIMEOUT'), 10.0)  # проверка токенов при запуске, секунды
+    CLIENT: str = os.getenv('VK_CLIENT', 'aiohttp')  # aiohttp или threaded (vk_api в пуле потоков)
+    THREAD_POOL_SIZE: int = safe_int(os.getenv('VK_THREAD_POOL_SIZE'), 16)
+    SINGLE_FLIGHT: bool = os.getenv('VK_SINGLE_FLIGHT', 'true').lower() in ('1', 'true', 'yes')
+    USERS_GET_BATCH_WINDOW: float = safe_float(os.getenv('VK_USERS_GET_BATCH_WINDOW'), 0.02)  # 0 - без объединения
+    PHOTOS_CACHE_TTL: float = safe_float(os.getenv('VK_PHOTOS_CACHE_TTL'), 600.0)  # секунды
+    CITY_CACHE_FILE: str = os.getenv('VK_CITY_CACHE_FILE', 'city_cache.json')  # пусто - не сохранять
+    CITY_NEGATIVE_TTL: float = safe_float(os.getenv('VK_CITY_NEGATIVE_TTL'), 3600.0)  # секунды
+    # Лимиты VK: 3 запроса в секунду на токен пользователя, 20 - на токен сообщества
+    USER_TOKEN_RPS: float = safe_float(os.getenv('VK_USER_TOKEN_RPS'), 3.0)  # 0 - без ограничения
+    GROUP_TOKEN_RPS: float = safe_float(os.getenv('VK_GROUP_TOKEN_RPS'), 20.0)  # 0 - без ограничения
+    RATE_LIMIT_BURST: int = safe_int(os.getenv('VK_RATE_LIMIT_BURST'), 1)
+    METHOD_RATE_LIMITS: str = os.getenv('VK_METHOD_RATE_LIMITS', '')  # 'users.search=1,photos.get=2'
+    RATE_LIMIT_BACKEND: str = os.getenv('VK_RATE_LIMIT_BACKEND', 'auto')  # local, file или auto (file под supervisor.py)
+    RATE_LIMIT_DIR: str = os.getenv('VK_RATE_LIMIT_DIR', '')  # пусто - временный каталог системы
+    SEND_QUEUE: bool = os.getenv('VK_SEND_QUEUE', 'true').lower() in ('1', 'true', 'yes')
+    SEND_RPS: float = safe_float(os.getenv('VK_SEND_RPS'), 15.0)  # messages.send в секунду, 0 - без ограничения
+    SEND_WORKERS: int = safe_int(os.getenv('VK_SEND_WORKERS'), 4)  # одновременных messages.send
+    SEND_RETRIES: int = safe_int(os.getenv('VK_SEND_RETRIES'), 3)
+    RETRY_ATTEMPTS: int = safe_int(os.getenv('VK_RETRY_ATTEMPTS'), 3)  # попыток вызова на чтение
+    RETRY_BASE_DELAY: float = safe_float(os.getenv('VK_RETRY_BASE_DELAY'), 0.2)  # секунды
+    RETRY_BUDGET_RATIO: float = safe_float(os.getenv('VK_RETRY_BUDGET_RATIO'), 0.1)  # повторов на вызов
+    BREAKER_FAILURES: int = safe_int(os.getenv('VK_BREAKER_FAILURES'), 5)  # ошибок подряд до отключения метода
+    BREAKER_OPEN_SECONDS: float = safe_float(os.getenv('VK_BREAKER_OPEN_SECONDS'), 30.0)
+    ADAPTIVE_CONCURRENCY: bool = os.getenv('VK_ADAPTIVE_CONCURRENCY', 'true').lower() in ('1', 'true', 'yes')
+    CONCURRENCY_INITIAL: int = safe_int(os.getenv('VK_CONCURRENCY_INITIAL'), 8)  # одновременных вызовов метода
+    CONCURRENCY_MIN: int = safe_int(os.getenv('VK_CONCURRENCY_MIN'), 1)
+    CONCURRENCY_MAX: int = safe_int(os.getenv('VK_CONCURRENCY_MAX'), 64)
+    LATENCY_SPIKE_FACTOR: float = safe_float(os.getenv('VK_LATENCY_SPIKE_FACTOR'), 2.0)  # во сколько раз медленнее среднего
+    HEDGE_METHODS: str = os.getenv('VK_HEDGE_METHODS', '')  # 'users.search,photos.get', пусто - выключено
+    HEDGE_PERCENTILE: float = safe_float(os.getenv('VK_HEDGE_PERCENTILE'), 95.0)
+    HEDGE_BUDGET_PERCENT: float = safe_float(os.getenv('VK_HEDGE_BUDGET_PERCENT'), 5.0)  # % дублей от вызовов
+    COALESCE_MESSAGES: bool = os.getenv('VK_COALESCE_MESSAGES', 'true').lower() in ('1', 'true', 'yes')
+    LONGPOLL_WAIT: int = safe_int(os.getenv('VK_LONGPOLL_WAIT'), 25)
+    CALLBACK_CONFIRMATION: str = os.getenv('VK_CALLBACK_CONFIRMATION', '')
+    CALLBACK_SECRET: str = os.getenv('VK_CALLBACK_SECRET', '')
+    CALLBACK_PATH: str = os.getenv('VK_CALLBACK_PATH', '/callback')
+    CALLBACK_HOST: str = os.getenv('VK_CALLBACK_HOST', '0.0.0.0')
+    CALLBACK_PORT: int = safe_int(os.getenv('VK_CALLBACK_PORT'), 8080)
+    CALLBACK_HEALTH_PATH: str = os.getenv('VK_CALLBACK_HEALTH_PATH', '/health')  # пусто - без проверки состояния
+
+@dataclass
+class BotConfig:
+    MODE: str = os.getenv('BOT_MODE', 'longpoll')  # longpoll или callback
+    WORKERS: int = safe_int(os.getenv('BOT_WORKERS'), os.cpu_count() or 1)
+    MAX_CONCURRENCY: int = safe_int(os.getenv('BOT_MAX_CONCURRENCY'), 32)
+    QUEUE_HIGH_WATERMARK: int = safe_int(os.getenv('BOT_QUEUE_HIGH_WATERMARK'), 1000)
+    QUEUE_LOW_WATERMARK: int = safe_int(os.getenv('BOT_QUEUE_LOW_WATERMARK'), 500)
+    QUEUE_MAX_SIZE: int = safe_int(os.getenv('BOT_QUEUE_MAX_SIZE'), 2000)
+    DEDUP_WINDOW: float = safe_float(os.getenv('BOT_DEDUP_WINDOW'), 600.0)
+    PAYLOAD_DEDUP_WINDOW: float = safe_float(os.getenv('BOT_PAYLOAD_DEDUP_WINDOW'), 2.0)
+    SHUTDOWN_TIMEOUT: float = safe_float(os.getenv('BOT_SHUTDOWN_TIMEOUT'), 20.0)
+    CHECKPOINT_FILE: str = os.getenv('BOT_CHECKPOINT_FILE', 'longpoll_checkpoint.json')  # пусто - не сохранять
+    CHECKPOINT_INTERVAL: float = safe_float(os.getenv('BOT_CHECKPOINT_INTERVAL'), 1.0)
+    RECORD_FILE: str = os.getenv('BOT_RECORD_FILE', '')  # пусто - не записывать события
+    RECORD_API_RESPONSES: bool = os.getenv('BOT_RECORD_API_RESPONSES', '').lower() in ('1', 'true', 'yes')
+    STATS_INTERVAL: int = safe_int(os.getenv('BOT_STATS_INTERVAL'), 60)
 
 @dataclass
 class AppConfig:
     DATABASE: DatabaseConfig = field(default_factory=DatabaseConfig)  # Исправлено здесь
     VK: VKConfig = field(default_factory=VKConfig)  # И здесь
+    BOT: BotConfig = field(default_factory=BotConfig)
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
 
 config = AppConfig()
\ No newline at end of file
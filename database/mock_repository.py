@@ -237,6 +237,29 @@ class MockDatabaseRepository:
             logger.error(f"Error getting user rating: {e}")
             return None
 
+    def get_rated_users(self, user_id: int, rating_type: str = None) -> List[int]:
+        """Получает список оцененных пользователей (с фильтром по типу оценки)"""
+        user_ratings = getattr(self, 'user_ratings', {}).get(user_id, {})
+        return [
+            rated_vk_id for rated_vk_id, rating_data in user_ratings.items()
+            if rating_type is None or rating_data['rating_type'] == rating_type
+        ]
+
+    def get_blacklisted_users(self, user_id: int) -> List[int]:
+        """Получает список пользователей в черном списке"""
+        return self.get_rated_users(user_id, 'blacklist')
+
+    def save_user_preferences(self, user_id: int, preferences: Dict[str, Any]) -> bool:
+        """Сохраняет настройки поиска пользователя"""
+        if not hasattr(self, 'preferences'):
+            self.preferences = {}
+        self.preferences[user_id] = dict(preferences)
+        return True
+
+    def get_user_preferences(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получает настройки поиска пользователя"""
+        return getattr(self, 'preferences', {}).get(user_id)
+
     def close(self):
         """Закрытие соединения (для совместимости)"""
         logger.info("Mock database repository closed")
@@ -0,0 +1,113 @@
+"""
+Защита от повторной обработки одних и тех же событий
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import TimeBucketedSet
+
+logger = logging.getLogger(__name__)
+
+
+class EventDeduplicator:
+    """
+    Отсекает повторы событий перед MessageHandler:
+    - повторную доставку VK (тот же event_id или id сообщения);
+    - двойные нажатия кнопки: тот же payload от того же пользователя, пока
+      предыдущее такое же нажатие еще ждет в очереди или обрабатывается, и
+      не позже payload_window секунд после него (по времени сообщения VK).
+      Кнопки оценки шлют одинаковый payload для всех анкет, поэтому нажатие
+      после ответа бота - уже оценка следующей анкеты, а не повтор.
+    Для принятого нажатия вызывающий после обработки вызывает finish_tap.
+    """
+
+    def __init__(self, event_window: float = 600.0, payload_window: float = 2.0,
+                 max_items: int = 100000):
+        self._seen_events = TimeBucketedSet(event_window, max_items=max_items)
+        self.payload_window = payload_window
+        # (user_id, payload) -> [нажатий в обработке, время последнего нажатия]
+        self._active_taps: Dict[Tuple[Any, str], List[float]] = {}
+
+        self.duplicates = 0
+        self.repeated_taps = 0
+
+    def mark_handled(self, event_id: str) -> None:
+        """Запоминает event_id события, обработанного до перезапуска"""
+        self._seen_events.add(('event', event_id))
+
+    @staticmethod
+    def _tap_key(event: Dict[str, Any]) -> Optional[Tuple[Any, str]]:
+        message = event.get('object', {}).get('message', {})
+        if message.get('payload') and message.get('from_id') is not None:
+            return message['from_id'], message['payload']
+        return None
+
+    def is_duplicate(self, event: Dict[str, Any]) -> bool:
+        """Проверяет событие и запоминает его; True - событие уже обрабатывалось"""
+        return self.is_redelivery(event) or self.is_repeated_tap(event)
+
+    def is_redelivery(self, event: Dict[str, Any]) -> bool:
+        """True - VK уже доставлял это событие"""
+        message = event.get('object', {}).get('message', {})
+        user_id = message.get('from_id')
+
+        event_keys = []
+        if event.get('event_id'):
+            event_keys.append(('event', event['event_id']))
+        if message.get('id'):
+            event_keys.append(('message', message['id']))
+        elif message.get('conversation_message_id'):
+            event_keys.append(('conversation', message.get('peer_id'), message['conversation_message_id']))
+
+        # Запоминаем все ключи, даже если событие уже встречалось под другим
+        new_keys = [self._seen_events.add(key) for key in event_keys]
+        if event_keys and not all(new_keys):
+            self.duplicates += 1
+            logger.info(f"Повторная доставка события от {user_id}, пропускаем")
+            return True
+        return False
+
+    def is_repeated_tap(self, event: Dict[str, Any]) -> bool:
+        """
+        True - такое же нажатие еще не обработано; иначе нажатие запоминается
+        до вызова finish_tap
+        """
+        key = self._tap_key(event)
+        if key is None:
+            return False
+
+        # Время сообщения, а не приема: при догоне после перезапуска события
+        # принимаются пачкой, хотя нажаты были в разное время
+        tapped_at = event.get('object', {}).get('message', {}).get('date') or time.time()
+        active = self._active_taps.get(key)
+        if active is not None and tapped_at - active[1] <= self.payload_window:
+            self.repeated_taps += 1
+            logger.info(f"Повторное нажатие {key[1]} от {key[0]}, пропускаем")
+            return True
+
+        if active is None:
+            self._active_taps[key] = [1, tapped_at]
+        else:
+            active[0] += 1
+            active[1] = tapped_at
+        return False
+
+    def finish_tap(self, event: Dict[str, Any]) -> None:
+        """Нажатие, принятое is_duplicate/is_repeated_tap, обработано или отброшено"""
+        key = self._tap_key(event)
+        active = self._active_taps.get(key) if key is not None else None
+        if active is not None:
+            active[0] -= 1
+            if active[0] <= 0:
+                del self._active_taps[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Возвращает счетчики отсеянных событий"""
+        return {
+            'duplicates': self.duplicates,
+            'repeated_taps': self.repeated_taps,
+            'tracked_events': len(self._seen_events),
+            'active_taps': len(self._active_taps)
+        }
@@ -0,0 +1,276 @@
+"""
+Диспетчер входящих событий: порядок внутри пользователя, параллельность между пользователями
+"""
+
+import asyncio
+import json
+import logging
+import time
+import traceback
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+RejectCallback = Callable[[Dict[str, Any]], None]
+DoneCallback = Callable[[], None]
+
+# Приоритеты событий при перегрузке
+PRIORITY_LOW = 0        # Можно отбросить: повторные "далее", нажатия меню
+PRIORITY_NORMAL = 1     # Отбрасываются только при полном заполнении очереди
+PRIORITY_SETTINGS = 2   # Изменение настроек - сохраняем всегда
+
+LOW_PRIORITY_COMMANDS = {'next', 'skip', 'search', 'main_menu', 'back', 'favorites'}
+SETTINGS_COMMANDS = {
+    'age', 'city', 'sex', 'preferred_sex', 'edit_profile', 'city_input',
+    'age_selected', 'city_selected', 'sex_selected', 'preferred_sex_selected'
+}
+
+
+def get_event_user_id(event: Dict[str, Any]) -> Optional[int]:
+    """Извлекает from_id из события message_new"""
+    try:
+        return event['object']['message']['from_id']
+    except (KeyError, TypeError):
+        return None
+
+
+def get_event_message(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Формирует словарь сообщения для MessageHandler.handle_message"""
+    message_data = event['object']['message']
+    return {
+        'id': message_data.get('id'),
+        'from_id': message_data['from_id'],
+        'text': message_data['text'],
+        'payload': message_data.get('payload')
+    }
+
+
+def get_event_command(event: Dict[str, Any]) -> Optional[str]:
+    """Извлекает команду из payload события (None для обычного текста)"""
+    try:
+        payload = event['object']['message'].get('payload')
+        if not payload:
+            return None
+        payload_data = json.loads(payload)
+        if 'sex' in payload_data:
+            return 'sex_selected'
+        return payload_data.get('command')
+    except (KeyError, TypeError, AttributeError, json.JSONDecodeError):
+        return None
+
+
+def is_same_request(event: Dict[str, Any], other: Dict[str, Any]) -> bool:
+    """Одно и то же нажатие: тот же payload или та же команда"""
+    payload = event.get('object', {}).get('message', {}).get('payload')
+    if payload and payload == other.get('object', {}).get('message', {}).get('payload'):
+        return True
+    command = get_event_command(event)
+    return command is not None and command == get_event_command(other)
+
+
+def get_event_priority(event: Dict[str, Any]) -> int:
+    """Определяет приоритет события для сброса нагрузки"""
+    command = get_event_command(event)
+    if command is None or command in SETTINGS_COMMANDS:
+        # Текст без payload может быть вводом возраста или города
+        return PRIORITY_SETTINGS
+    if command in LOW_PRIORITY_COMMANDS:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+class EventDispatcher:
+    """
+    Раскладывает события по очередям (шардам) с ключом from_id.
+
+    События одного пользователя обрабатываются строго по очереди, поэтому
+    FSM и current_matches не видят гонок. Разные пользователи обрабатываются
+    параллельно, но не более max_concurrency обработчиков одновременно.
+
+    Очередь ограничена: при достижении high_watermark включается сброс
+    нагрузки (до снижения до low_watermark) - низкоприоритетные события
+    схлопываются с ожидающими такими же (та же команда или payload) или
+    отклоняются через on_reject, а при
+    max_pending отклоняется всё, кроме изменения настроек.
+    """
+
+    def __init__(self, handler: EventHandler, max_concurrency: int = 32,
+                 high_watermark: int = 1000, low_watermark: int = 500,
+                 max_pending: int = 2000,
+                 on_reject: Optional[RejectCallback] = None):
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_pending = max(max_pending, high_watermark)
+        self.on_reject = on_reject
+        self.shedding = False
+        self.accepting = True
+        self._pending = 0
+
+        # user_id -> очередь (время постановки, событие, callback завершения)
+        self._shards: Dict[Any, Deque[Tuple[float, Dict[str, Any], Optional[DoneCallback]]]] = {}
+        self._workers: Dict[Any, asyncio.Task] = {}
+
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        """Количество событий, ожидающих обработки"""
+        return self._pending
+
+    def _update_shedding(self) -> None:
+        """Переключает режим сброса нагрузки с гистерезисом по watermark"""
+        if not self.shedding and self._pending >= self.high_watermark:
+            self.shedding = True
+            logger.warning(f"⚠️ Очередь событий достигла {self._pending}, включен сброс нагрузки")
+        elif self.shedding and self._pending <= self.low_watermark:
+            self.shedding = False
+            logger.info(f"Очередь событий снизилась до {self._pending}, сброс нагрузки выключен")
+
+    def _admit(self, user_id: Any, event: Dict[str, Any], sheddable: bool) -> bool:
+        """Решает, принять ли событие при текущей загрузке"""
+        self._update_shedding()
+        if not self.shedding or not sheddable:
+            return True
+
+        priority = get_event_priority(event)
+        if priority == PRIORITY_SETTINGS:
+            return True
+        if priority == PRIORITY_NORMAL and self._pending < self.max_pending:
+            return True
+
+        queue = self._shards.get(user_id)
+        if queue and any(is_same_request(event, queued) for _, queued, _ in queue):
+            # Такое же нажатие уже ждет в очереди - ответ пользователь получит,
+            # поэтому дубликат просто схлопываем без отдельного уведомления
+            self.coalesced += 1
+            return False
+
+        self.rejected += 1
+        if self.on_reject is not None:
+            try:
+                self.on_reject(event)
+            except Exception as e:
+                logger.error(f"Ошибка уведомления об отклонении события: {e}")
+        return False
+
+    def submit(self, event: Dict[str, Any], on_done: Optional[DoneCallback] = None,
+               sheddable: bool = True) -> bool:
+        """
+        Ставит событие в очередь его пользователя; False - событие сброшено.
+        on_done вызывается после обработки принятого события (в том числе неудачной),
+        но не при отмене обработки.
+        sheddable=False - событие не сбрасывается при перегрузке
+        (вызывающий сам ограничивает поток через wait_for_capacity).
+        """
+        user_id = get_event_user_id(event)
+
+        if not self.accepting:
+            logger.warning(f"Событие от {user_id} получено во время остановки, пропускаем")
+            return False
+        if not self._admit(user_id, event, sheddable):
+            return False
+
+        queue = self._shards.get(user_id)
+        if queue is None:
+            queue = self._shards[user_id] = deque()
+        queue.append((time.monotonic(), event, on_done))
+        self._pending += 1
+
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._run_shard(user_id))
+        return True
+
+    async def _run_shard(self, user_id: Any) -> None:
+        """Последовательно обрабатывает очередь одного пользователя"""
+        queue = self._shards[user_id]
+        try:
+            while queue:
+                async with self._semaphore:
+                    _, event, on_done = queue.popleft()
+                    self._pending -= 1
+                    self._update_shedding()
+                    self.in_flight += 1
+                    try:
+                        await self.handler(event)
+                        self.processed += 1
+                    except Exception as e:
+                        self.failed += 1
+                        logger.error(f"Ошибка обработки события пользователя {user_id}: {e}")
+                        logger.error(f"Трассировка: {traceback.format_exc()}")
+                    finally:
+                        self.in_flight -= 1
+                    # Отмененное при остановке событие не считается обработанным:
+                    # checkpoint не продвинется за него, и после перезапуска его догонят
+                    if on_done is not None:
+                        on_done()
+        finally:
+            # Очередь пуста (или задача отменена) - освобождаем шард
+            self._workers.pop(user_id, None)
+            if not queue:
+                self._shards.pop(user_id, None)
+
+    async def wait_for_capacity(self, limit: int) -> None:
+        """Ждет, пока в очереди останется не больше limit событий"""
+        while self._pending > limit:
+            await asyncio.sleep(0.05)
+
+    async def drain(self, timeout: Optional[float]) -> int:
+        """
+        Перестает принимать события и ждет обработки уже принятых не дольше timeout
+        (None - без ограничения).
+        Возвращает число событий, которые не успели обработаться.
+        """
+        self.accepting = False
+        workers = list(self._workers.values())
+        if workers:
+            logger.info(f"Ожидаем обработки {self._pending + self.in_flight} событий...")
+            _, still_running = await asyncio.wait(workers, timeout=timeout)
+        else:
+            still_running = set()
+
+        lost = self._pending + self.in_flight
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            await asyncio.gather(*still_running, return_exceptions=True)
+            logger.warning(f"Не дождались обработки {lost} событий")
+        return lost if still_running else 0
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Возвращает метрики для подбора max_concurrency:
+        глубину очередей и задержку (lag) самых отстающих шардов
+        """
+        now = time.monotonic()
+        lags = {
+            user_id: (len(queue), now - queue[0][0])
+            for user_id, queue in self._shards.items() if queue
+        }
+        slowest = sorted(lags.items(), key=lambda item: item[1][1], reverse=True)[:top]
+
+        return {
+            'pending': self._pending,
+            'shedding': self.shedding,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'active_shards': len(self._workers),
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'processed': self.processed,
+            'failed': self.failed,
+            'max_lag': slowest[0][1][1] if slowest else 0.0,
+            'shards': {
+                user_id: {'depth': depth, 'lag': round(lag, 3)}
+                for user_id, (depth, lag) in slowest
+            }
+        }
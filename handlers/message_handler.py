@@ -6,9 +6,10 @@ from .models import StateData, UserState
 from services.service_factory import ServiceFactory
 
 from services.service_factory import ServiceFactory
+from services.send_queue import PRIORITY_CARD, PRIORITY_NOTICE
 from keyboards.keyboard_manager import KeyboardManager
 from utils import format_user_profile, format_favorites_list
-from utils import async_retry, ValidationError
+from utils import async_retry, ValidationError, VKAPIError
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +27,11 @@ class MessageHandler:
         
     async def handle_message(self, message: dict) -> None:
         """Обрабатывает входящие сообщения"""
+        # Ответы на одно событие уходят одним сообщением, где это возможно
+        async with self.user_service.vk_service.coalesce_messages():
+            await self._handle_message(message)
+
+    async def _handle_message(self, message: dict) -> None:
         try:
             user_id = message.get('from_id')
             message_text = message.get('text', '')
@@ -180,7 +186,7 @@ class MessageHandler:
         logger.info(f"Начинаем поиск для пользователя {user_id}")
         
         # Получаем информацию о пользователе
-        user_info = self.user_service.process_user(user_id)
+        user_info = await self.user_service.process_user(user_id)
         logger.info(f"Получена информация о пользователе: {user_info}")
         
         if not user_info:
@@ -218,7 +224,8 @@ class MessageHandler:
             await self.user_service.vk_service.send_message(
                 user_id,
                 "💡 Рекомендуем настроить предпочтения по полу для более точного поиска.\n\nВы можете сделать это в главном меню или продолжить поиск с текущими настройками.",
-                self.keyboard_manager.create_main_keyboard(inline=True)
+                self.keyboard_manager.create_main_keyboard(inline=True),
+                priority=PRIORITY_NOTICE
             )
             
         # Ищем первого пользователя
@@ -227,7 +234,7 @@ class MessageHandler:
 
     async def _handle_next(self, user_id: int) -> None:
         """Показывает следующего пользователя"""
-        user_info = self.user_service.process_user(user_id)
+        user_info = await self.user_service.process_user(user_id)
         if user_info:
             await self._show_next_match(user_id, user_info)
 
@@ -284,7 +291,7 @@ class MessageHandler:
                     self.keyboard_manager.create_search_keyboard(inline=True)
                 )
                 # Показываем следующего пользователя
-                user_info = self.user_service.process_user(user_id)
+                user_info = await self.user_service.process_user(user_id)
                 await self._show_next_match(user_id, user_info)
             else:
                 await self.user_service.vk_service.send_message(
@@ -335,7 +342,7 @@ class MessageHandler:
                 return
             
             # Получаем текущую информацию о пользователе
-            user_info = self.user_service.process_user(user_id)
+            user_info = await self.user_service.process_user(user_id)
             if not user_info:
                 await self.user_service.vk_service.send_message(
                     user_id,
@@ -507,8 +514,22 @@ class MessageHandler:
         city = message.strip()
         
         if len(city) > 0:
+            # Проверяем город по справочнику (VK - только для незнакомых названий)
+            try:
+                match = await self.user_service.vk_service.resolve_city(city)
+                if match is None:
+                    await self.user_service.vk_service.send_message(
+                        user_id,
+                        f"❌ Город «{city}» не найден. Проверьте название и введите еще раз:"
+                    )
+                    return
+                city = match[1]
+            except VKAPIError as e:
+                # VK недоступен - сохраняем название как есть
+                logger.warning(f"Не удалось проверить город {city}: {e}")
+
             # Получаем текущую информацию о пользователе
-            user_info = self.user_service.process_user(user_id)
+            user_info = await self.user_service.process_user(user_id)
             
             if user_info:
                 # Обновляем город пользователя
@@ -570,7 +591,7 @@ class MessageHandler:
             }
         )
         
-        match = self.user_service.find_next_match(user_id, user_info)
+        match = await self.user_service.find_next_match(user_id, user_info)
         
         if not match:
             await self.user_service.vk_service.send_message(
@@ -592,7 +613,10 @@ class MessageHandler:
             user_id,
             message,
             self.keyboard_manager.create_search_keyboard(inline=True),
-            attachment
+            attachment,
+            priority=PRIORITY_CARD,
+            # Анкета запоминается, только если она дошла до пользователя
+            flush=True
         )
         
         if success:
@@ -622,7 +646,7 @@ class MessageHandler:
         """Пропускает пользователя без оценки"""
         if user_id in self.current_matches:
             # Просто показываем следующего без сохранения оценки
-            user_info = self.user_service.process_user(user_id)
+            user_info = await self.user_service.process_user(user_id)
             await self._show_next_match(user_id, user_info)
         else:
             await self.user_service.vk_service.send_message(
@@ -657,7 +681,7 @@ class MessageHandler:
             )
             
             # Показываем следующего пользователя
-            user_info = self.user_service.process_user(user_id)
+            user_info = await self.user_service.process_user(user_id)
             await self._show_next_match(user_id, user_info)
         else:
             await self.user_service.vk_service.send_message(
@@ -694,7 +718,7 @@ class MessageHandler:
                 return
             
             # Получаем информацию о пользователе
-            user_info = self.user_service.process_user(user_id)
+            user_info = await self.user_service.process_user(user_id)
             if not user_info:
                 await self.user_service.vk_service.send_message(
                     user_id,
@@ -799,7 +823,7 @@ class MessageHandler:
     async def _handle_edit_profile(self, user_id: int) -> None:
         """Обрабатывает запрос на редактирование профиля"""
         # Получаем текущую информацию о пользователе
-        user_info = self.user_service.process_user(user_id)
+        user_info = await self.user_service.process_user(user_id)
         
         if user_info:
             current_info = []
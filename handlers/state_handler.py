@@ -12,10 +12,11 @@ from utils.data_models import UserState, StateData
 
 # from database.repository import DatabaseRepository  # Используем ServiceFactory
 from services.vk_service import VKService
-from utils import ValidationError, validate_age, validate_city, validate_sex
+from utils import ValidationError, VKAPIError, validate_age, validate_city, validate_sex
 from services.search_service import SearchService  
 from services.favorite_service import FavoriteService  
 from services.service_factory import ServiceFactory  
+from services.send_queue import PRIORITY_NOTICE
 from utils import ValidationError, validate_age, validate_city, validate_sex
 from keyboards.keyboard_manager import KeyboardManager 
 
@@ -229,6 +230,13 @@ class StateHandler:
         """Обработчик установки города"""
         try:
             city = validate_city(message)
+            try:
+                match = await self.vk_service.resolve_city(city)
+                if match is None:
+                    raise ValidationError(f"Город «{city}» не найден")
+                city = match[1]
+            except VKAPIError as e:
+                logger.warning(f"Не удалось проверить город {city}: {e}")
             # Сохраняем город
             state_data.context['city'] = city
             await self.set_user_state(user_id, state_data)
@@ -321,7 +329,7 @@ class StateHandler:
     async def _show_next_profile(self, user_id: int, state_data: StateData) -> None:
         """Показывает следующий профиль"""
         # Здесь будет интеграция с SearchService
-        await self.vk_service.send_message(user_id, "🔄 Ищем подходящих людей...")
+        await self.vk_service.send_message(user_id, "🔄 Ищем подходящих людей...", priority=PRIORITY_NOTICE)
         # TODO: Интеграция с поисковым сервисом
     
     async def _add_to_favorites(self, user_id: int, state_data: StateData) -> None:
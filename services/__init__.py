@@ -3,6 +3,8 @@ Services package for VKinder Bot
 """
 
 from .vk_service import VKService
+from .async_vk_service import AsyncVKService
+from .threaded_vk_service import ThreadedVKService
 from .user_service import UserService
 from .search_service import SearchService
 from .favorite_service import FavoriteService
@@ -10,6 +12,8 @@ from .service_factory import ServiceFactory
 
 __all__ = [
     'VKService', 
+    'AsyncVKService',
+    'ThreadedVKService',
     'UserService', 
     'SearchService', 
     'FavoriteService',
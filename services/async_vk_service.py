@@ -0,0 +1,647 @@
+"""
+VKService с асинхронными методами поверх AsyncVKClient
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from config.settings import config
+from database.models import VKUser
+from services.city_resolver import CityMatch, CityResolver
+from services.vk_client import AsyncVKClient
+from services.send_queue import PRIORITY_REPLY, MessageBuffer, SendQueue
+from services.vk_hedging import Hedger, parse_methods
+from services.vk_rate_limits import VKRateLimits, parse_method_limits, token_key
+from services.vk_retry import FLOOD, FATAL, CircuitOpenError, RetryBudget, RetryPolicy, classify_error
+from services.vk_token_pool import AUTH_ERROR, TokenPool, parse_tokens
+from services.vk_service import VKService
+from services.vk_client import prepare_params
+from utils import AdaptiveConcurrencyLimiter, MicroBatcher, SingleFlight, TTLCache, VKAPIError, chunk_list, create_rate_limit_backend
+
+logger = logging.getLogger(__name__)
+
+
+# Методы только на чтение: одинаковые одновременные вызовы можно объединить.
+# execute может выполнять любой код, поэтому на чтение он только там, где
+# вызывающий сам это указывает (read_only=True у _call)
+SHAREABLE_ACTIONS = ('get', 'search', 'is', 'resolve')
+
+
+def is_shareable(method: str) -> bool:
+    """Можно ли отдать результат вызова метода нескольким вызывающим"""
+    return method != 'execute' and method.rsplit('.', 1)[-1].startswith(SHAREABLE_ACTIONS)
+
+
+# Буфер сообщений текущей обработки события (см. AsyncVKService.coalesce_messages)
+_outgoing: ContextVar[Optional[MessageBuffer]] = ContextVar('vk_outgoing_messages', default=None)
+
+
+class AsyncVKService(VKService):
+    """
+    Те же методы, что у VKService, но это корутины: запросы идут через
+    aiohttp с пулом соединений и не блокируют цикл событий.
+    Параметры запросов и разбор ответов общие с VKService.
+    """
+
+    def __init__(self, client: Optional[AsyncVKClient] = None):
+        self.client = client or self._create_client()
+        self.user_token = config.VK.USER_TOKEN
+        self.group_token = config.VK.GROUP_TOKEN
+
+        # Вызовы от имени пользователя (user_token) распределяются между всеми
+        # токенами пользователя: у каждого свой лимит частоты и суточные квоты
+        self.token_pool = TokenPool(parse_tokens(self.user_token, config.VK.USER_TOKENS))
+
+        # Результаты проверки токенов (validate_tokens): имя токена -> pending,
+        # ok, invalid (VK отклонил токен), timeout или unreachable
+        self.token_status: Dict[str, str] = {
+            label: 'pending' for label in [*map(self.token_pool.label, self.token_pool.tokens), 'group']
+        }
+
+        # utils.EventRecorder для записи вызовов API (включается в app.py)
+        self.recorder = None
+
+        # Топ фотографий кандидатов: соседние страницы поиска пересекаются
+        self.photos_cache = TTLCache(config.VK.PHOTOS_CACHE_TTL)
+
+        # users.get отдельных пользователей, запрошенные почти одновременно,
+        # уходят одним запросом (до 1000 id)
+        self.users_batcher = MicroBatcher(
+            self._fetch_users,
+            window=config.VK.USERS_GET_BATCH_WINDOW,
+            max_batch=self.USERS_GET_BATCH_SIZE
+        )
+
+        # Одинаковые одновременные запросы на чтение (например, одна страница
+        # users.search по одному городу) выполняются один раз
+        self.single_flight = SingleFlight()
+
+        # Названия городов -> ID: справочник в памяти и на диске, VK только при промахе
+        self.city_resolver = CityResolver(
+            cache_file=config.VK.CITY_CACHE_FILE or None,
+            negative_ttl=config.VK.CITY_NEGATIVE_TTL
+        )
+
+        # Лимиты частоты запросов общие для всех сервисов процесса
+        self.rate_limits = VKRateLimits(
+            parse_method_limits(config.VK.METHOD_RATE_LIMITS),
+            burst=config.VK.RATE_LIMIT_BURST,
+            # Хранилище на файлах делит лимиты между процессами хоста
+            backend=create_rate_limit_backend(config.VK.RATE_LIMIT_BACKEND, config.VK.RATE_LIMIT_DIR)
+        )
+        for token in self.token_pool.tokens:
+            self.rate_limits.add_token(token, config.VK.USER_TOKEN_RPS, self.token_pool.label(token))
+        self.rate_limits.add_token(self.group_token, config.VK.GROUP_TOKEN_RPS, 'group')
+
+        # messages.send идут через очередь с приоритетами и своим лимитом,
+        # чтобы ответы на кнопки не ждали за поиском и уведомлениями
+        # Повторы при ошибках VK: общий бюджет и выключатели по методам
+        self.retry_policy = RetryPolicy(
+            attempts=config.VK.RETRY_ATTEMPTS,
+            base_delay=config.VK.RETRY_BASE_DELAY,
+            budget=RetryBudget(config.VK.RETRY_BUDGET_RATIO),
+            breaker_failures=config.VK.BREAKER_FAILURES,
+            breaker_open_for=config.VK.BREAKER_OPEN_SECONDS
+        )
+
+        # Число одновременных вызовов каждого метода подстраивается под ответы VK
+        self.concurrency: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+        # Дублирование медленных вызовов на чтение (только перечисленные методы)
+        self.hedgers: Dict[str, Hedger] = {}
+        for method in parse_methods(config.VK.HEDGE_METHODS):
+            if not is_shareable(method):
+                logger.warning(f"VK_HEDGE_METHODS: {method} изменяет данные, дублировать его нельзя - пропущен")
+                continue
+            self.hedgers[method] = Hedger(
+                percentile=config.VK.HEDGE_PERCENTILE,
+                budget_percent=config.VK.HEDGE_BUDGET_PERCENT
+            )
+
+        self.coalesced = 0
+
+        self.send_queue = None
+        if config.VK.SEND_QUEUE:
+            limiter = None
+            if config.VK.SEND_RPS > 0:
+                limiter = self.rate_limits.create_limiter(
+                    'send:' + token_key(self.group_token or ''), config.VK.SEND_RPS
+                )
+            self.send_queue = SendQueue(
+                self._send,
+                limiter=limiter,
+                budget=self.retry_policy.budget,
+                workers=config.VK.SEND_WORKERS,
+                retries=config.VK.SEND_RETRIES
+            )
+
+    def _create_client(self) -> Optional[AsyncVKClient]:
+        return AsyncVKClient()
+
+    async def _request(self, token: str, method: str, params: Dict[str, Any]) -> Any:
+        """Выполняет запрос к VK API"""
+        return await self.client.call(method, params, token)
+
+    async def _call(self, token: str, method: str, params: Dict[str, Any],
+                    read_only: bool = False) -> Any:
+        """
+        Вызывает метод VK API. Если такой же вызов на чтение уже выполняется,
+        дожидается его результата вместо нового запроса.
+        read_only=True - вызов только читает данные, даже если по имени метода
+        этого не видно (execute с известным кодом)
+        """
+        read_only = read_only or is_shareable(method)
+        if not config.VK.SINGLE_FLIGHT or not read_only:
+            return await self._call_once(token, method, params, read_only)
+
+        key = (token, method, tuple(sorted(prepare_params(params).items())))
+        return await self.single_flight.run(key, lambda: self._call_once(token, method, params, read_only))
+
+    async def _call_once(self, token: str, method: str, params: Dict[str, Any],
+                         read_only: bool = False) -> Any:
+        """
+        Выполняет вызов с учетом выключателя метода. Вызовы на чтение
+        повторяются при временных ошибках и превышении лимита, пока позволяет
+        бюджет повторов; messages.send повторяет очередь отправки.
+        Вызов с user_token выполняется токеном пула с наибольшим запасом квоты;
+        если ошибка касается только этого токена, вызов сразу повторяется другим
+        """
+        breaker = self.retry_policy.breaker(method)
+        if not breaker.allow():
+            raise CircuitOpenError(f"VK API method {method} is temporarily disabled after repeated errors")
+
+        pool = self.token_pool if token == self.user_token and len(self.token_pool) else None
+        retryable = read_only or is_shareable(method)
+        self.retry_policy.budget.record_call()
+        attempt = 1
+        switches = 0
+        try:
+            while True:
+                attempt_token = pool.pick(method) if pool is not None else token
+                if pool is not None:
+                    pool.begin(attempt_token)
+                try:
+                    response = await self._hedged_attempt(attempt_token, method, params)
+                except VKAPIError as e:
+                    if (pool is not None and pool.report_error(attempt_token, method, e)
+                            and pool.available(method, exclude=attempt_token) and switches < len(pool)):
+                        switches += 1
+                        if classify_error(e) == FLOOD:
+                            await self.rate_limits.penalize(attempt_token, method, 1.0)
+                        logger.warning(f"Повтор {method} другим токеном вместо {pool.label(attempt_token)}: {e}")
+                        continue
+
+                    kind = classify_error(e)
+                    if kind == FATAL:
+                        # VK ответил - метод работает
+                        breaker.record_success()
+                        raise
+                    breaker.record_failure()
+                    if kind == FLOOD:
+                        # Лимит превышен для всех вызовов с этим токеном
+                        await self.rate_limits.penalize(attempt_token, method, 1.0)
+
+                    delay = self.retry_policy.retry_delay(kind, attempt) if retryable else None
+                    if delay is None or not breaker.allow():
+                        raise
+                    logger.warning(f"Повтор {method} через {delay:.2f}с (попытка {attempt + 1}): {e}")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                finally:
+                    if pool is not None:
+                        pool.end(attempt_token)
+
+                if pool is not None:
+                    pool.report_success(attempt_token)
+                self._mark_token_ok(attempt_token)
+                breaker.record_success()
+                return response
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except VKAPIError:
+            # Ответы VK уже учтены выключателем в цикле
+            raise
+        except Exception:
+            # Непредвиденная ошибка (в т.ч. пробного вызова) - тоже сбой метода,
+            # иначе выключатель так и остался бы ждать результата пробы
+            breaker.record_failure()
+            raise
+
+    async def _hedged_attempt(self, token: str, method: str, params: Dict[str, Any]) -> Any:
+        """
+        Попытка вызова; если метод хеджируется и ответа нет дольше его p95,
+        параллельно отправляется такой же запрос и берется первый успешный ответ.
+        Задержка считается от отправки запроса, а не от ожидания лимитов:
+        вызов, который ждет своей очереди, дублировать бесполезно
+        """
+        hedger = self.hedgers.get(method)
+        if hedger is None:
+            return await self._attempt(token, method, params)
+
+        loop = asyncio.get_running_loop()
+        # Задача попытки -> время отправки запроса (после лимитов)
+        sent: Dict[asyncio.Future, asyncio.Future] = {}
+
+        def start() -> asyncio.Future:
+            sent_at = loop.create_future()
+            task = asyncio.ensure_future(self._attempt(
+                token, method, params, on_sent=lambda: sent_at.set_result(time.monotonic())
+            ))
+            sent[task] = sent_at
+            return task
+
+        delay = hedger.delay()
+        primary = start()
+        tasks = {primary}
+        try:
+            if delay is not None:
+                await asyncio.wait({primary, sent[primary]}, return_when=asyncio.FIRST_COMPLETED)
+                if not primary.done():
+                    timeout = sent[primary].result() + delay - time.monotonic()
+                    done, _ = await asyncio.wait(tasks, timeout=max(0.0, timeout))
+                    if not done and hedger.try_hedge():
+                        tasks.add(start())
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            hedger.hedge_wins += 1
+                        hedger.observe(time.monotonic() - sent[task].result())
+                        return task.result()
+            # Оба запроса завершились ошибкой - отдаем ошибку основного
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _concurrency_limiter(self, method: str) -> Optional[AdaptiveConcurrencyLimiter]:
+        if not config.VK.ADAPTIVE_CONCURRENCY:
+            return None
+        limiter = self.concurrency.get(method)
+        if limiter is None:
+            limiter = self.concurrency[method] = AdaptiveConcurrencyLimiter(
+                initial=config.VK.CONCURRENCY_INITIAL,
+                min_limit=config.VK.CONCURRENCY_MIN,
+                max_limit=config.VK.CONCURRENCY_MAX,
+                spike_factor=config.VK.LATENCY_SPIKE_FACTOR
+            )
+        return limiter
+
+    async def _attempt(self, token: str, method: str, params: Dict[str, Any],
+                       on_sent: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Одна попытка вызова с учетом лимитов (записывается, если включена запись).
+        on_sent вызывается, когда лимиты пройдены и запрос отправляется
+        """
+        # Сначала лимит частоты: слот одновременности не простаивает, пока
+        # вызов ждет своей очереди по частоте
+        await self.rate_limits.acquire(token, method)
+        limiter = self._concurrency_limiter(method)
+        if limiter is not None:
+            await limiter.acquire()
+        latency = None
+        overload = False
+        try:
+            started = time.monotonic()
+            if on_sent is not None:
+                on_sent()
+            try:
+                response = await self._request(token, method, params)
+            except Exception as e:
+                # Превышение лимита, таймаут или сетевая ошибка - VK перегружен
+                overload = isinstance(e, VKAPIError) and classify_error(e) != FATAL
+                if self.recorder is not None:
+                    self.recorder.record_api_call(method, params, time.monotonic() - started, error=str(e))
+                raise
+            latency = time.monotonic() - started
+        finally:
+            if limiter is not None:
+                limiter.release(latency, overload)
+
+        if self.recorder is not None:
+            self.recorder.record_api_call(method, params, latency, response)
+        return response
+
+    async def _fetch_users(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """users.get для пачки пользователей: {id: данные пользователя}"""
+        result = {}
+        for batch in chunk_list(user_ids, self.USERS_GET_BATCH_SIZE):
+            response = await self._call(self.group_token, 'users.get', self._user_info_params(batch))
+            for user_data in response or []:
+                result[user_data['id']] = user_data
+        return result
+
+    async def get_user_info(self, user_id: int) -> Optional[VKUser]:
+        """Получает информацию о пользователе ВКонтакте"""
+        try:
+            if config.VK.USERS_GET_BATCH_WINDOW > 0:
+                user_data = await self.users_batcher.get(int(user_id))
+                response = [user_data] if user_data else None
+            else:
+                response = await self._call(self.group_token, 'users.get', self._user_info_params(user_id))
+            return self._parse_user_info(user_id, response)
+        except VKAPIError as e:
+            logger.error(f"VK API Error getting user info: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error getting user info: {e}")
+            return None
+
+    async def get_users_info(self, user_ids: List[int]) -> Dict[int, VKUser]:
+        """Получает информацию о нескольких пользователях (до 1000 id за запрос)"""
+        try:
+            users = await self._fetch_users([int(user_id) for user_id in user_ids])
+        except VKAPIError as e:
+            logger.error(f"VK API Error getting users info: {e}")
+            return {}
+        return {
+            user_id: self._parse_user_info(user_id, [user_data])
+            for user_id, user_data in users.items()
+        }
+
+    async def _lookup_city(self, city_name: str) -> Optional[CityMatch]:
+        """database.getCities: (ID, название) первого найденного города"""
+        # Используем пользовательский токен для получения ID города
+        response = await self._call(self.user_token, 'database.getCities', self._city_params(city_name))
+        city_id = self._parse_city_id(response)
+        if city_id is None:
+            return None
+        return city_id, response['items'][0]['title']
+
+    async def resolve_city(self, city_name: str) -> Optional[CityMatch]:
+        """
+        Находит город по названию: (ID, название в VK) или None, если такого
+        города нет. Ошибки VK API не перехватываются
+        """
+        return await self.city_resolver.resolve(city_name, self._lookup_city)
+
+    async def get_city_id(self, city_name: str) -> Optional[int]:
+        """Получает ID города по названию"""
+        try:
+            match = await self.resolve_city(city_name)
+            return match[0] if match else None
+        except VKAPIError as e:
+            logger.error(f"VK API Error getting city ID: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error getting city ID: {e}")
+            return None
+
+    async def search_users(self, age: int, sex: int, city: str, offset: int = 0) -> List[Dict[str, Any]]:
+        """Ищет пользователей по критериям"""
+        try:
+            city_id = await self.get_city_id(city)
+            if not city_id:
+                logger.warning(f"Could not find city ID for: {city}")
+                return []
+
+            response = await self._call(self.user_token, 'users.search', self._search_params(age, sex, city_id, offset))
+            return self._parse_search(response)
+        except VKAPIError as e:
+            logger.error(f"VK API Error searching users: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"Unexpected error searching users: {e}")
+            return []
+
+    async def get_top_photos(self, user_id: int) -> List[Tuple[str, int]]:
+        """Получает топ-3 фотографии пользователя по лайкам"""
+        try:
+            response = await self._call(self.user_token, 'photos.get', self._photos_params(user_id))
+            return self._parse_top_photos(response)
+        except VKAPIError as e:
+            logger.error(f"VK API Error getting photos: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"Unexpected error getting photos: {e}")
+            return []
+
+    def get_cached_top_photos(self, user_ids: List[int]) -> Dict[int, List[Tuple[str, int]]]:
+        """Топ фотографий из кэша для тех пользователей, для кого он есть"""
+        result = {}
+        for user_id in user_ids:
+            photos = self.photos_cache.get(user_id)
+            if photos is not None:
+                result[user_id] = photos
+        return result
+
+    async def get_top_photos_batch(self, user_ids: List[int]) -> Dict[int, List[Tuple[str, int]]]:
+        """
+        Получает топ фотографий сразу для нескольких пользователей:
+        до 25 вызовов photos.get в одном запросе execute
+        """
+        result = self.get_cached_top_photos(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in result]
+
+        for batch in chunk_list(missing, self.EXECUTE_BATCH_SIZE):
+            try:
+                # Код только читает фотографии - вызов можно повторять и объединять
+                response = await self._call(self.user_token, 'execute', {
+                    'code': self._photos_execute_code(batch),
+                    'v': config.VK.API_VERSION
+                }, read_only=True)
+                photos_by_user = self._parse_top_photos_batch(batch, response)
+                for user_id, photos in photos_by_user.items():
+                    self.photos_cache.set(user_id, photos)
+            except Exception as e:
+                if isinstance(e, CircuitOpenError) or (isinstance(e, VKAPIError) and classify_error(e) != FATAL):
+                    # Сбой или лимит VK: 25 отдельных photos.get только умножат нагрузку
+                    raise
+                # Пустой ответ photos.get при ошибке не кэшируем
+                logger.error(f"Error getting photos via execute, falling back to photos.get: {e}")
+                photos_by_user = dict(zip(batch, await asyncio.gather(
+                    *(self.get_top_photos(user_id) for user_id in batch)
+                )))
+            result.update(photos_by_user)
+
+        return result
+
+    async def _send(self, params: Dict[str, Any]) -> Any:
+        """messages.send без очереди"""
+        return await self._call(self.group_token, 'messages.send', params)
+
+    @asynccontextmanager
+    async def coalesce_messages(self) -> AsyncIterator[MessageBuffer]:
+        """
+        Сообщения, отправленные внутри блока, копятся и уходят при выходе из него:
+        несколько подряд сообщений одному пользователю - одним messages.send.
+        send_message внутри блока сразу возвращает True
+        """
+        if not config.VK.COALESCE_MESSAGES or _outgoing.get() is not None:
+            yield None
+            return
+
+        buffer = MessageBuffer()
+        token = _outgoing.set(buffer)
+        try:
+            yield buffer
+        finally:
+            _outgoing.reset(token)
+            messages = buffer.drain()
+            self.coalesced += buffer.merged
+            for user_id, params in messages:
+                await self._deliver_message(user_id, **params)
+
+    async def send_message(self, user_id: int, message: str,
+                           keyboard: Optional[str] = None,
+                           attachment: Optional[str] = None,
+                           priority: int = PRIORITY_REPLY,
+                           flush: bool = False) -> bool:
+        """
+        Отправляет сообщение пользователю (priority - см. services.send_queue).
+        Внутри coalesce_messages сообщение откладывается до конца обработки
+        события, и результат отправки неизвестен - возвращается True.
+        flush=True - отправить сейчас вместе с отложенными сообщениями этому
+        пользователю и вернуть настоящий результат отправки
+        """
+        buffer = _outgoing.get()
+        if buffer is None or buffer.closed:
+            return await self._deliver_message(user_id, message, keyboard, attachment, priority)
+
+        buffer.add(user_id, message, keyboard, attachment, priority)
+        if not flush:
+            return True
+        results = [await self._deliver_message(user_id, **params) for params in buffer.take(user_id)]
+        return all(results)
+
+    async def _deliver_message(self, user_id: int, message: str,
+                               keyboard: Optional[str] = None,
+                               attachment: Optional[str] = None,
+                               priority: int = PRIORITY_REPLY) -> bool:
+        """Отправляет сообщение сразу, без склейки"""
+        params = self._message_params(user_id, message, keyboard, attachment)
+        if self.send_queue is not None:
+            return await self.send_queue.send_message(user_id, params, priority)
+
+        try:
+            await self._send(params)
+            return True
+        except VKAPIError as e:
+            logger.error(f"VK API Error sending message: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error sending message: {e}")
+            return False
+
+    async def _check_token(self, label: str, token: str, method: str, params: Dict[str, Any],
+                           timeout: Optional[float]) -> str:
+        """Проверяет один токен; возвращает статус для token_status"""
+        async def check():
+            # Через лимит токена: при одновременном перезапуске нескольких
+            # процессов проверки не должны сами упереться в лимит VK
+            await self.rate_limits.acquire(token, method)
+            await self._request(token, method, params)
+
+        try:
+            await asyncio.wait_for(check(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Token {label} check timed out after {timeout}s")
+            return 'timeout'
+        except VKAPIError as e:
+            if e.code != AUTH_ERROR:
+                # Сеть, лимит или внутренняя ошибка VK - о самом токене это
+                # ничего не говорит
+                logger.warning(f"⚠️ Token {label} check failed: {e}")
+                return 'unreachable'
+            logger.error(f"❌ Invalid {label} token: {e}")
+            if token in self.token_pool:
+                self.token_pool.disable(token, str(e))
+            return 'invalid'
+        except Exception as e:
+            logger.warning(f"⚠️ Token {label} check failed: {e}")
+            return 'unreachable'
+        logger.info(f"✅ Token {label} valid")
+        return 'ok'
+
+    async def validate_tokens(self, timeout: Optional[float] = None) -> None:
+        """
+        Проверяет все VK токены одновременно, каждый не дольше timeout секунд.
+        Недействительные токены пользователя отключаются. Результат - в
+        token_status и health(); VKAPIError - если VK отклонил токен сообщества
+        или все токены пользователя
+        """
+        checks = {
+            self.token_pool.label(token): self._check_token(
+                self.token_pool.label(token), token, 'users.get', {'user_ids': 1}, timeout
+            )
+            for token in self.token_pool.tokens
+        }
+        checks['group'] = self._check_token('group', self.group_token, 'groups.getById', {}, timeout)
+
+        statuses = await asyncio.gather(*checks.values())
+        self.token_status.update(zip(checks, statuses))
+
+        health = self.health()
+        if health['status'] == 'failed':
+            invalid = ', '.join(label for label, status in health['tokens'].items() if status == 'invalid')
+            raise VKAPIError(f"Invalid VK tokens: {invalid or 'user token is not set'}")
+
+    def _mark_token_ok(self, token: str) -> None:
+        """Токен ответил: проверка при запуске могла не пройти из-за сети или лимита"""
+        if token == self.group_token:
+            label = 'group'
+        elif token in self.token_pool:
+            label = self.token_pool.label(token)
+        else:
+            return
+        if self.token_status.get(label) not in ('ok', 'pending'):
+            self.token_status[label] = 'ok'
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Состояние токенов: failed - VK отклонил токен сообщества или все токены
+        пользователя, starting - проверка еще идет, degraded - часть токенов
+        не работает или не проверена, ok - все токены действительны.
+        Успешный вызов с токеном после проверки делает его статус ok
+        """
+        tokens = dict(self.token_status)
+        # Токен мог быть отозван уже во время работы
+        for label, stats in self.token_pool.get_stats().items():
+            if stats['state'] == 'disabled':
+                tokens[label] = 'invalid'
+
+        user = [status for label, status in tokens.items() if label != 'group']
+        if tokens['group'] == 'invalid' or all(status == 'invalid' for status in user):
+            status = 'failed'
+        elif 'pending' in tokens.values():
+            status = 'starting'
+        elif any(status != 'ok' for status in tokens.values()):
+            status = 'degraded'
+        else:
+            status = 'ok'
+        return {'status': status, 'tokens': tokens}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики объединения запросов к VK API"""
+        return {
+            'users_get': self.users_batcher.get_stats(),
+            'single_flight': self.single_flight.get_stats(),
+            'cities': self.city_resolver.get_stats(),
+            'rate_limits': self.rate_limits.get_stats(),
+            'user_tokens': self.token_pool.get_stats(),
+            'send_queue': self.send_queue.get_stats() if self.send_queue is not None else None,
+            'coalesced': self.coalesced,
+            'retries': self.retry_policy.get_stats(),
+            'concurrency': {method: limiter.get_stats() for method, limiter in self.concurrency.items()},
+            'hedging': {method: hedger.get_stats() for method, hedger in self.hedgers.items()}
+        }
+
+    async def close(self) -> None:
+        """Отправляет оставшиеся сообщения и закрывает пул HTTP-соединений"""
+        if self.send_queue is not None:
+            await self.send_queue.close()
+        await self.city_resolver.flush()
+        if self.client is not None:
+            await self.client.close()
+        if self.rate_limits.backend is not None:
+            self.rate_limits.backend.close()
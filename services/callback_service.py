@@ -0,0 +1,107 @@
+"""
+HTTP-сервер для приема событий через Callback API ВКонтакте
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from aiohttp import web
+
+from config.settings import config
+
+logger = logging.getLogger(__name__)
+
+EventCallback = Callable[[Dict[str, Any]], None]
+HealthCallback = Callable[[], Dict[str, Any]]
+
+# Состояния, при которых проверка состояния отвечает 503
+UNHEALTHY = ('failed', 'stopping')
+
+
+class CallbackServer:
+    """
+    Принимает POST-запросы Callback API: отвечает строкой подтверждения
+    на confirmation, проверяет secret и сразу возвращает "ok", передавая
+    событие в on_event (обработка идет асинхронно, вне HTTP-запроса).
+    С health на GET health_path отдается состояние бота в JSON
+    """
+
+    def __init__(self, on_event: EventCallback,
+                 group_id: int = None,
+                 confirmation_code: str = None,
+                 secret: str = None,
+                 path: str = None,
+                 event_types: Iterable[str] = ('message_new',),
+                 health: Optional[HealthCallback] = None,
+                 health_path: str = None):
+        self.on_event = on_event
+        self.health = health
+        self.health_path = health_path if health_path is not None else config.VK.CALLBACK_HEALTH_PATH
+        self.group_id = group_id if group_id is not None else config.VK.GROUP_ID
+        self.confirmation_code = confirmation_code if confirmation_code is not None else config.VK.CALLBACK_CONFIRMATION
+        self.secret = secret if secret is not None else config.VK.CALLBACK_SECRET
+        self.path = path or config.VK.CALLBACK_PATH
+        self.event_types = set(event_types)
+
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        """Создает aiohttp-приложение (удобно для локального тестового клиента)"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_request)
+        if self.health is not None and self.health_path:
+            app.router.add_get(self.health_path, self.handle_health)
+        return app
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Состояние бота: 200, пока он может обрабатывать события, иначе 503"""
+        health = self.health()
+        return web.json_response(health, status=503 if health['status'] in UNHEALTHY else 200)
+
+    async def handle_request(self, request: web.Request) -> web.Response:
+        """Обрабатывает один запрос Callback API"""
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400, text='bad request')
+
+        if not isinstance(data, dict):
+            return web.Response(status=400, text='bad request')
+
+        if self.group_id and data.get('group_id') != self.group_id:
+            logger.warning(f"Callback API: событие чужого сообщества {data.get('group_id')}")
+            return web.Response(status=403, text='forbidden')
+
+        if data.get('type') == 'confirmation':
+            return web.Response(text=self.confirmation_code or '')
+
+        if self.secret and data.get('secret') != self.secret:
+            logger.warning("Callback API: неверный secret")
+            return web.Response(status=403, text='forbidden')
+
+        if data.get('type') in self.event_types:
+            try:
+                self.on_event(data)
+            except Exception as e:
+                # VK повторит доставку, если ответ не "ok" - не блокируем его из-за нашей ошибки
+                logger.error(f"Ошибка передачи события из Callback API: {e}")
+
+        return web.Response(text='ok')
+
+    async def start(self, host: str = None, port: int = None) -> None:
+        """Запускает HTTP-сервер"""
+        host = host or config.VK.CALLBACK_HOST
+        port = port or config.VK.CALLBACK_PORT
+
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        logger.info(f"🌐 Callback API сервер слушает http://{host}:{port}{self.path}")
+
+    async def stop(self) -> None:
+        """Останавливает HTTP-сервер"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,127 @@
+"""
+Сохранение позиции long poll (ts) между перезапусками бота
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """Пачка событий одного ответа long poll"""
+
+    def __init__(self, ts_after: str, count: int):
+        self.ts_after = ts_after
+        self.remaining = count
+        self.handled: List[str] = []
+
+
+class LongPollCheckpoint:
+    """
+    Хранит ts, до которого все события уже обработаны.
+
+    Пачки событий фиксируются строго по порядку: ts пачки сохраняется только
+    после обработки всех ее событий и всех предыдущих пачек. event_id событий
+    из еще не зафиксированных пачек тоже сохраняются - после перезапуска
+    такие события будут получены повторно и пропущены.
+    Запись на диск выполняется пачками не чаще раза в flush_interval секунд.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+
+        self.committed_ts: Optional[str] = None
+        self._batches: 'OrderedDict[int, _Batch]' = OrderedDict()
+        self._next_batch_id = 0
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Читает сохраненную позицию: {'ts': ..., 'handled': [...]}"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать checkpoint {self.path}: {e}")
+            return None
+
+        self.committed_ts = data.get('ts')
+        logger.info(f"Загружен checkpoint long poll: ts={self.committed_ts}, "
+                    f"обработанных событий после него: {len(data.get('handled', []))}")
+        return data
+
+    def start_batch(self, ts_after: str, count: int) -> int:
+        """Регистрирует пачку из count событий, после которой позиция станет ts_after"""
+        batch_id = self._next_batch_id
+        self._next_batch_id += 1
+        self._batches[batch_id] = _Batch(ts_after, count)
+        self._advance()
+        return batch_id
+
+    def complete(self, batch_id: int, event_id: Optional[str] = None) -> None:
+        """Отмечает одно событие пачки как обработанное"""
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            return
+        batch.remaining -= 1
+        if event_id:
+            batch.handled.append(event_id)
+        self._dirty = True
+        self._advance()
+
+    def _advance(self) -> None:
+        """Фиксирует ts всех обработанных пачек в начале очереди"""
+        while self._batches:
+            batch_id, batch = next(iter(self._batches.items()))
+            if batch.remaining > 0:
+                break
+            self._batches.pop(batch_id)
+            self.committed_ts = batch.ts_after
+            self._dirty = True
+
+    def _handled_after_commit(self) -> Set[str]:
+        handled = set()
+        for batch in self._batches.values():
+            handled.update(batch.handled)
+        return handled
+
+    def flush(self) -> None:
+        """Атомарно записывает позицию на диск, если она изменилась"""
+        if not self._dirty or self.committed_ts is None:
+            return
+
+        data = {'ts': self.committed_ts, 'handled': sorted(self._handled_after_commit())}
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.error(f"Не удалось сохранить checkpoint {self.path}: {e}")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def start(self) -> None:
+        """Запускает периодическую запись на диск"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Останавливает периодическую запись и сохраняет последнюю позицию"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        self.flush()
@@ -0,0 +1,279 @@
+"""
+Определение ID города ВКонтакте по названию без лишних запросов к VK API
+
+Обновить встроенный справочник (cities.json) основными городами из VK:
+python -m services.city_resolver dump
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.settings import config
+from utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cities.json')
+
+# (id города, название)
+CityMatch = Tuple[int, str]
+CityLookup = Callable[[str], Awaitable[Optional[CityMatch]]]
+
+
+def normalize_city_name(name: str) -> str:
+    """Нормализует название: регистр, ё/е, дефисы, точки и лишние пробелы не важны"""
+    name = name.lower().replace('ё', 'е')
+    name = re.sub(r'^(г|гор|город)\.?\s+', '', name.strip())
+    name = re.sub(r'[\s\-\.]+', ' ', name)
+    return name.strip()
+
+
+class _TrieNode:
+    __slots__ = ('children', 'match')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        # (ранг, id, название) - ранг меньше у более крупных городов
+        self.match: Optional[Tuple[int, int, str]] = None
+
+
+class CityResolver:
+    """
+    Префиксное дерево нормализованных названий городов.
+
+    Порядок поиска: точное совпадение -> единственное продолжение префикса
+    (как database.getCities с count=1) -> запрос к VK -> нечеткое совпадение
+    (опечатки) -> отрицательный кэш. Ответы VK и найденные по опечатке
+    варианты запоминаются и сохраняются в cache_file (flush - периодически
+    и при остановке), поэтому один и тот же город запрашивается у VK не
+    больше одного раза.
+    """
+
+    def __init__(self, cache_file: Optional[str] = None, seed_file: Optional[str] = SEED_FILE,
+                 negative_ttl: float = 3600.0):
+        self.cache_file = cache_file
+        self._root = _TrieNode()
+        self._size = 0
+        # Выученные названия: нормализованное название -> (id, название)
+        self._learned: Dict[str, CityMatch] = {}
+        # Есть выученные названия, еще не записанные в cache_file
+        self._dirty = False
+        self._not_found = TTLCache(negative_ttl)
+
+        self.hits = 0
+        self.lookups = 0
+
+        if seed_file:
+            self._load(seed_file)
+        if cache_file:
+            self._load(cache_file)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать справочник городов {path}: {e}")
+            return
+
+        for rank, (city_id, title) in enumerate(data.get('cities', [])):
+            self.add(city_id, title, rank=rank)
+        for name, (city_id, title) in data.get('aliases', {}).items():
+            self.add(city_id, title, alias=name)
+            self._learned[name] = (city_id, title)
+        logger.info(f"Загружен справочник городов {path}: {self._size} названий")
+
+    async def flush(self) -> None:
+        """Сохраняет новые выученные названия в потоке, не блокируя цикл событий"""
+        if not self.cache_file or not self._dirty:
+            return
+        self._dirty = False
+        learned = dict(self._learned)
+        if not await asyncio.get_running_loop().run_in_executor(None, self._write, learned):
+            self._dirty = True
+
+    def save(self) -> None:
+        """Атомарно сохраняет выученные названия, объединяя их с уже сохраненными"""
+        if not self.cache_file or not self._learned:
+            return
+        if self._write(dict(self._learned)):
+            self._dirty = False
+
+    def _write(self, learned: Dict[str, CityMatch]) -> bool:
+        aliases = {}
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                aliases = json.load(f).get('aliases', {})
+        except (OSError, ValueError):
+            pass
+        aliases.update({name: list(match) for name, match in learned.items()})
+
+        # Свой временный файл у каждого процесса: рабочие процессы супервизора
+        # сохраняют справочник одновременно
+        tmp_path = f'{self.cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'aliases': aliases}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+            return True
+        except OSError as e:
+            logger.error(f"Не удалось сохранить справочник городов {self.cache_file}: {e}")
+            return False
+
+    def add(self, city_id: int, title: str, alias: Optional[str] = None, rank: int = 1_000_000) -> None:
+        """Добавляет город под его названием (или под другим написанием alias)"""
+        node = self._root
+        for char in normalize_city_name(alias or title):
+            node = node.children.setdefault(char, _TrieNode())
+        if node.match is None:
+            self._size += 1
+        if node.match is None or rank < node.match[0]:
+            node.match = (rank, city_id, title)
+
+    def _find_node(self, key: str) -> Optional[_TrieNode]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _single_below(self, node: _TrieNode) -> Optional[Tuple[int, int, str]]:
+        """Город, если префикс продолжается только им (псевдонимы не в счет), иначе None"""
+        found = None
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.match:
+                if found is not None and current.match[1] != found[1]:
+                    # Несколько городов - выбор оставляем VK или нечеткому поиску
+                    return None
+                found = current.match
+            stack.extend(current.children.values())
+        return found
+
+    def _fuzzy(self, key: str, max_distance: int) -> Optional[Tuple[int, int, str]]:
+        """Ближайшее по расстоянию Левенштейна название (обход дерева со строками DP)"""
+        best = None  # (расстояние, ранг, id, название)
+
+        def walk(node: _TrieNode, char: str, previous_row: List[int]) -> None:
+            nonlocal best
+            row = [previous_row[0] + 1]
+            for i in range(1, len(key) + 1):
+                row.append(min(
+                    row[i - 1] + 1,
+                    previous_row[i] + 1,
+                    previous_row[i - 1] + (key[i - 1] != char)
+                ))
+            if node.match and row[-1] <= max_distance:
+                candidate = (row[-1],) + node.match
+                if best is None or candidate < best:
+                    best = candidate
+            if min(row) <= max_distance:
+                for next_char, child in node.children.items():
+                    walk(child, next_char, row)
+
+        first_row = list(range(len(key) + 1))
+        for char, child in self._root.children.items():
+            walk(child, char, first_row)
+        return best[1:] if best else None
+
+    def resolve_local(self, name: str, fuzzy: bool = False) -> Optional[CityMatch]:
+        """Ищет город только в справочнике"""
+        key = normalize_city_name(name)
+        if not key:
+            return None
+
+        node = self._find_node(key)
+        match = None
+        if node is not None:
+            # Целое слово с продолжением через пробел/дефис может быть другим
+            # городом, которого нет в справочнике ("Ростов" - не Ростов-на-Дону)
+            if node.match is None and len(key) >= 3 and ' ' not in node.children:
+                match = self._single_below(node)
+            else:
+                match = node.match
+        if match is None and fuzzy:
+            match = self._fuzzy(key, 1 if len(key) <= 6 else 2)
+        return (match[1], match[2]) if match else None
+
+    def _learn(self, name: str, match: CityMatch) -> None:
+        key = normalize_city_name(name)
+        self.add(match[0], match[1])
+        self.add(match[0], match[1], alias=key)
+        self._learned[key] = match
+        self._dirty = True
+
+    async def resolve(self, name: str, lookup: CityLookup) -> Optional[CityMatch]:
+        """Ищет город в справочнике, при промахе - через lookup (запрос к VK)"""
+        self.lookups += 1
+        match = self.resolve_local(name)
+        if match:
+            self.hits += 1
+            return match
+
+        key = normalize_city_name(name)
+        if not key or key in self._not_found:
+            return None
+
+        match = await lookup(name)
+        if match is None:
+            # VK не знает такого названия - возможно, опечатка в известном городе
+            match = self.resolve_local(name, fuzzy=True)
+        if match is None:
+            self._not_found.set(key, True)
+            return None
+
+        self._learn(name, match)
+        return match
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'known': self._size
+        }
+
+
+async def dump_main_cities(output: str) -> None:
+    """Сохраняет основные города России из VK в справочник"""
+    from services.vk_client import AsyncVKClient
+
+    client = AsyncVKClient()
+    try:
+        response = await client.call('database.getCities', {
+            'country_id': 1,
+            'need_all': 0,
+            'count': 1000
+        }, config.VK.USER_TOKEN)
+    finally:
+        await client.close()
+
+    cities = [[item['id'], item['title']] for item in response.get('items', [])]
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'cities': cities}, f, ensure_ascii=False, indent=1)
+    print(f"Сохранено городов: {len(cities)} -> {output}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Справочник городов VKinder Bot")
+    parser.add_argument('command', choices=['dump'], help="dump - выгрузить основные города из VK")
+    parser.add_argument('--output', default=SEED_FILE, help="куда сохранить справочник")
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        asyncio.run(dump_main_cities(args.output))
+
+
+if __name__ == "__main__":
+    main()
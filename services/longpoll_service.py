@@ -0,0 +1,164 @@
+"""
+Асинхронный клиент Bots Long Poll API ВКонтакте
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from config.settings import config
+from utils import VKAPIError, safe_json_request
+
+logger = logging.getLogger(__name__)
+
+VK_API_URL = 'https://api.vk.com/method/'
+
+
+class LongPollService:
+    """
+    Получает события сообщества через groups.getLongPollServer на aiohttp,
+    не блокируя цикл событий во время ожидания ответа сервера
+    """
+
+    def __init__(self, group_token: str, group_id: int,
+                 wait: int = None,
+                 event_types: Iterable[str] = ('message_new',)):
+        self.group_token = group_token
+        self.group_id = group_id
+        self.wait = wait if wait is not None else config.VK.LONGPOLL_WAIT
+        self.event_types = set(event_types)
+
+        self.server: Optional[str] = None
+        self.key: Optional[str] = None
+        self.ts: Optional[str] = None
+
+        # Догоняем пропущенные события: опрос без ожидания до первого пустого ответа
+        self.catching_up = False
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._running = False
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает (создает при необходимости) HTTP-сессию"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def update_server(self, update_ts: bool = True) -> None:
+        """Запрашивает адрес long poll сервера, ключ и (опционально) ts"""
+        session = await self._get_session()
+        data = await safe_json_request(
+            VK_API_URL + 'groups.getLongPollServer',
+            {
+                'group_id': self.group_id,
+                'access_token': self.group_token,
+                'v': config.VK.API_VERSION
+            },
+            session
+        )
+
+        response = data.get('response', {})
+        self.server = response['server']
+        self.key = response['key']
+        if update_ts or self.ts is None:
+            self.ts = response['ts']
+
+        logger.info(f"Long poll сервер получен, ts={self.ts}")
+
+    def resume_from(self, ts: str) -> None:
+        """Продолжает с сохраненного ts, сначала догоняя пропущенные события"""
+        self.ts = ts
+        self.catching_up = True
+        logger.info(f"Long poll: догоняем события начиная с ts={ts}")
+
+    async def check(self) -> List[Dict[str, Any]]:
+        """Выполняет один long poll запрос и возвращает полученные события"""
+        if self.server is None:
+            # Сохраненный ts (resume_from) не перезаписываем
+            await self.update_server(update_ts=self.ts is None)
+
+        wait = 0 if self.catching_up else self.wait
+        session = await self._get_session()
+        params = {
+            'act': 'a_check',
+            'key': self.key,
+            'ts': self.ts,
+            'wait': wait
+        }
+        # Сервер держит соединение до wait секунд, поэтому даём запас
+        timeout = aiohttp.ClientTimeout(total=wait + 10)
+
+        try:
+            async with session.get(self.server, params=params, timeout=timeout) as response:
+                data = await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            return []
+        except aiohttp.ClientError as e:
+            raise VKAPIError(f"Long poll network error: {e}")
+
+        failed = data.get('failed')
+        if failed:
+            if failed == 1:
+                # История событий устарела, продолжаем с нового ts
+                logger.warning(f"Long poll: устаревший ts, новый ts={data.get('ts')}")
+                if self.catching_up:
+                    logger.warning("Long poll: часть пропущенных событий уже недоступна")
+                    self.catching_up = False
+                self.ts = data['ts']
+            elif failed == 2:
+                await self.update_server(update_ts=False)
+            elif failed == 3:
+                # Информация о сессии потеряна - продолжаем с нового ts сервера
+                if self.catching_up:
+                    logger.warning("Long poll: сессия утеряна, пропущенные с сохраненного ts события недоступны")
+                    self.catching_up = False
+                await self.update_server()
+            else:
+                raise VKAPIError(f"Long poll error: {data}")
+            return []
+
+        self.ts = data['ts']
+        updates = data.get('updates', [])
+        if self.catching_up and not updates:
+            logger.info(f"Long poll: пропущенные события получены, ts={self.ts}")
+            self.catching_up = False
+        return updates
+
+    async def listen_batches(self) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Асинхронно выдает пачки (ts после пачки, события нужных типов)
+        до вызова stop(); пустые пачки тоже выдаются - по ним сдвигается ts
+        """
+        self._running = True
+
+        while self._running:
+            try:
+                updates = await self.check()
+            except VKAPIError as e:
+                if not self._running:
+                    break
+                logger.error(f"Ошибка long poll: {e}")
+                await asyncio.sleep(5)  # Пауза перед повторной попыткой
+                continue
+
+            events = [event for event in updates if event.get('type') in self.event_types]
+            yield self.ts, events
+
+    async def listen(self) -> AsyncIterator[Dict[str, Any]]:
+        """Асинхронно выдает события нужных типов до вызова stop()"""
+        async for _, events in self.listen_batches():
+            for event in events:
+                yield event
+
+    def stop(self) -> None:
+        """Останавливает цикл listen() после текущего запроса"""
+        self._running = False
+
+    async def close(self) -> None:
+        """Останавливает прослушивание и закрывает HTTP-сессию"""
+        self.stop()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
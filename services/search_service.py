@@ -6,7 +6,7 @@ import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
-from utils import async_retry, VKAPIError, RateLimiter, ValidationError, validate_age, validate_city, validate_sex
+from utils import async_retry, VKAPIError, ValidationError, validate_age, validate_city, validate_sex
 # from database.repository import DatabaseRepository  # Используем ServiceFactory
 from services.vk_service import VKService
 from utils.data_models import StateData  # Только один импорт!
@@ -17,7 +17,7 @@ class SearchService:
     def __init__(self, vk_service: VKService, db_repository):
         self.vk_service = vk_service
         self.db_repository = db_repository
-        self.rate_limiter = RateLimiter(max_requests=3, period=1.0)
+        # Частоту запросов ограничивает vk_service (общие лимиты на токен)
     
     def get_search_preferences(self, state_data: StateData, user_info=None) -> Dict[str, Any]:
         """
@@ -79,15 +79,13 @@ class SearchService:
         Ищет потенциальных matches для пользователя с учетом offset
         """
         try:
-            await self.rate_limiter.acquire()
-            
             # Ищем пользователей
             # Если установлены предпочтения по полу, используем их вместо пола пользователя
             search_sex = search_params.get('preferred_sex')
             if search_sex is None or search_sex == 0:  # 0 означает "любой пол"
                 search_sex = search_params['sex']
             
-            found_users = self.vk_service.search_users(
+            found_users = await self.vk_service.search_users(
                 age=search_params['age'],
                 sex=search_sex,
                 city=search_params['city'],
@@ -126,35 +124,52 @@ class SearchService:
                 user_id, search_params, offset
             )
             
-            for user in potential_matches:
-                if user['id'] not in excluded_users:
-                    # Получаем фотографии
-                    photos = await self.process_user_photos(user['id'])
+            candidates = [user for user in potential_matches if user['id'] not in excluded_users]
+            
+            # Соседние страницы поиска пересекаются - фотографии многих кандидатов уже в кэше
+            photos_by_user = self.vk_service.get_cached_top_photos([user['id'] for user in candidates])
+            
+            for index, user in enumerate(candidates):
+                if user['id'] not in photos_by_user:
+                    # Фотографии получаем пачкой: до 25 кандидатов за один запрос execute
+                    batch_ids = [c['id'] for c in candidates[index:index + self.vk_service.EXECUTE_BATCH_SIZE]]
+                    fetched = await self.process_users_photos(batch_ids)
+                    if not fetched:
+                        # Запрос не удался - следующие пачки упрутся в тот же сбой VK
+                        logger.warning(f"Поиск для user_id {user_id} прерван: не удалось получить фотографии")
+                        break
+                    photos_by_user.update(fetched)
+                    # Кандидатов пачки больше не запрашиваем в этом проходе
+                    for candidate_id in batch_ids:
+                        photos_by_user.setdefault(candidate_id, [])
+                
+                photos = photos_by_user.get(user['id'])
+                
+                if photos:
+                    # Сохраняем пользователя в БД
+                    user_data = {
+                        'vk_id': user['id'],
+                        'first_name': user.get('first_name', ''),
+                        'last_name': user.get('last_name', ''),
+                        'age': search_params['age'],
+                        'city': search_params['city'],
+                        'sex': search_params['sex'],
+                        'profile_link': self.vk_service.create_profile_link(
+                            user['id'], user.get('domain')
+                        )
+                    }
+                    
+                    self.db_repository.add_found_user(user_data)
+                    self.db_repository.add_user_photos(user['id'], photos)
+                    
+                    # Добавляем в просмотренные
+                    self.db_repository.add_to_viewed(user_id, user['id'])
                     
-                    if photos:
-                        # Сохраняем пользователя в БД
-                        user_data = {
-                            'vk_id': user['id'],
-                            'first_name': user.get('first_name', ''),
-                            'last_name': user.get('last_name', ''),
-                            'age': search_params['age'],
-                            'city': search_params['city'],
-                            'sex': search_params['sex'],
-                            'profile_link': self.vk_service.create_profile_link(
-                                user['id'], user.get('domain')
-                            )
-                        }
-                        
-                        self.db_repository.add_found_user(user_data)
-                        
-                        # Добавляем в просмотренные
-                        self.db_repository.add_to_viewed(user_id, user['id'])
-                        
-                        return {
-                            'user': user_data,
-                            'photos': photos,
-                            'search_params': search_params
-                        }
+                    return {
+                        'user': user_data,
+                        'photos': photos,
+                        'search_params': search_params
+                    }
             
             return None
             
@@ -168,8 +183,7 @@ class SearchService:
     async def process_user_photos(self, vk_user_id: int) -> List[tuple]:
         """Обрабатывает фотографии пользователя"""
         try:
-            await self.rate_limiter.acquire()
-            photos = self.vk_service.get_top_photos(vk_user_id)
+            photos = await self.vk_service.get_top_photos(vk_user_id)
             
             if photos:
                 self.db_repository.add_user_photos(vk_user_id, photos)
@@ -183,6 +197,14 @@ class SearchService:
             logger.error(f"Неожиданная ошибка при обработке фотографий: {e}")
             return []
     
+    async def process_users_photos(self, vk_user_ids: List[int]) -> Dict[int, List[tuple]]:
+        """Получает фотографии нескольких пользователей (один запрос на 25 пользователей)"""
+        try:
+            return await self.vk_service.get_top_photos_batch(vk_user_ids)
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка при получении фотографий: {e}")
+            return {}
+    
     def get_search_statistics(self, user_id: int) -> Dict[str, Any]:
         """Получает статистику поиска для пользователя"""
         viewed_count = len(self.db_repository.get_viewed_users(user_id))
@@ -0,0 +1,288 @@
+"""
+Очередь исходящих сообщений с приоритетами
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.vk_retry import FATAL, RetryBudget, classify_error
+from utils import VKAPIError
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - важнее
+PRIORITY_REPLY = 0   # ответ на только что нажатую кнопку или сообщение
+PRIORITY_CARD = 1    # анкета кандидата
+PRIORITY_NOTICE = 2  # информационные сообщения
+
+# Ограничения messages.send
+MAX_MESSAGE_LENGTH = 4096
+MAX_ATTACHMENTS = 10
+
+SendFunction = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class _Message:
+    __slots__ = ('params', 'priority', 'future', 'attempts', 'queued_at')
+
+    def __init__(self, params: Dict[str, Any], priority: int, future: asyncio.Future):
+        self.params = params
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class MessageBuffer:
+    """
+    Сообщения, отправленные за обработку одного события: подряд идущие
+    сообщения одному пользователю склеиваются в одно - тексты через пустую
+    строку, клавиатура последнего сообщения, вложения вместе (до 10).
+    Если склейка превысит ограничения VK, начинается новое сообщение.
+    """
+
+    def __init__(self):
+        self._messages: Dict[int, List[Dict[str, Any]]] = {}
+        self.closed = False
+        # Сколько сообщений склеено с предыдущими
+        self.merged = 0
+
+    def add(self, user_id: int, message: str, keyboard: Optional[str] = None,
+            attachment: Optional[str] = None, priority: int = PRIORITY_REPLY) -> None:
+        attachments = [item for item in (attachment or '').split(',') if item]
+        messages = self._messages.setdefault(user_id, [])
+
+        if messages:
+            last = messages[-1]
+            text = f"{last['message']}\n\n{message}" if last['message'] and message else last['message'] or message
+            if (len(text) <= MAX_MESSAGE_LENGTH
+                    and len(last['attachments']) + len(attachments) <= MAX_ATTACHMENTS):
+                last['message'] = text
+                last['keyboard'] = keyboard or last['keyboard']
+                last['attachments'].extend(attachments)
+                last['priority'] = min(last['priority'], priority)
+                self.merged += 1
+                return
+
+        messages.append({
+            'message': message,
+            'keyboard': keyboard,
+            'attachments': attachments,
+            'priority': priority
+        })
+
+    @staticmethod
+    def _params(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'message': item['message'],
+            'keyboard': item['keyboard'],
+            'attachment': ','.join(item['attachments']) or None,
+            'priority': item['priority']
+        }
+
+    def take(self, user_id: int) -> List[Dict[str, Any]]:
+        """Забирает склеенные сообщения одного пользователя (параметры send_message)"""
+        return [self._params(item) for item in self._messages.pop(user_id, [])]
+
+    def drain(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Забирает склеенные сообщения: [(user_id, параметры send_message)]"""
+        self.closed = True
+        result = [
+            (user_id, self._params(item))
+            for user_id, messages in self._messages.items()
+            for item in messages
+        ]
+        self._messages.clear()
+        return result
+
+
+class SendQueue:
+    """
+    Отправляет messages.send не чаще лимита, выбирая самое важное сообщение
+    в момент, когда освобождается слот лимита.
+
+    Сообщения одного пользователя уходят строго по очереди: следующее - только
+    после ответа VK на предыдущее. Пользователь встает в очередь с приоритетом
+    самого важного из своих сообщений, поэтому ответ на кнопку не ждет, пока
+    отправятся уведомления других пользователей. Временные ошибки и превышение
+    лимита повторяются с тем же random_id - VK не продублирует сообщение.
+    """
+
+    def __init__(self, send: SendFunction, limiter: Optional[Any] = None,
+                 budget: Optional[RetryBudget] = None,
+                 workers: int = 4, retries: int = 3, retry_delay: float = 0.5):
+        self.send = send
+        self.limiter = limiter
+        # Общий с остальными вызовами VK бюджет повторов
+        self.budget = budget
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+        self._pending: Dict[int, Deque[_Message]] = {}
+        self._busy = set()
+        # [приоритет, порядковый номер, user_id, запись актуальна]
+        self._ready: List[List[Any]] = []
+        # user_id -> его актуальная запись в _ready: пользователь стоит в очереди один раз
+        self._scheduled: Dict[int, List[Any]] = {}
+        # Обработчики, которые ждут слот лимита
+        self._acquiring = 0
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.max_wait = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(messages) for messages in self._pending.values())
+
+    def _start(self) -> None:
+        # Задачи создаются в работающем цикле событий - при первой отправке
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def send_message(self, user_id: int, params: Dict[str, Any],
+                           priority: int = PRIORITY_REPLY) -> bool:
+        """Ставит сообщение в очередь и ждет результата отправки"""
+        if self._closing:
+            return False
+        if not self._tasks:
+            self._start()
+
+        params = dict(params)
+        if self.retries and not params.get('random_id'):
+            params['random_id'] = random.getrandbits(31)
+
+        message = _Message(params, priority, asyncio.get_running_loop().create_future())
+        self._pending.setdefault(user_id, deque()).append(message)
+        if user_id not in self._busy:
+            self._schedule(user_id)
+        return await message.future
+
+    def _schedule(self, user_id: int) -> None:
+        """Ставит пользователя в очередь готовых с приоритетом его самого важного сообщения"""
+        messages = self._pending.get(user_id)
+        if not messages:
+            self._pending.pop(user_id, None)
+            return
+        priority = min(message.priority for message in messages)
+        entry = self._scheduled.get(user_id)
+        if entry is not None:
+            if entry[0] <= priority:
+                return
+            # Пришло более важное сообщение - старая запись больше не действует
+            entry[3] = False
+        entry = self._scheduled[user_id] = [priority, next(self._counter), user_id, True]
+        heapq.heappush(self._ready, entry)
+        self._wakeup.set()
+
+    def _pop_ready(self) -> Optional[int]:
+        while self._ready:
+            _, _, user_id, actual = heapq.heappop(self._ready)
+            if actual:
+                del self._scheduled[user_id]
+                return user_id
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            # Слот лимита берется, только если для него есть пользователь:
+            # у каждого ждущего слот обработчика - свой пользователь в очереди
+            while len(self._scheduled) <= self._acquiring:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # Сначала слот лимита, потом выбор сообщения: пока ждали,
+            # могло прийти более важное
+            if self.limiter is not None:
+                self._acquiring += 1
+                try:
+                    await self.limiter.acquire()
+                finally:
+                    self._acquiring -= 1
+            user_id = self._pop_ready()
+            if user_id is None:
+                continue
+
+            self._busy.add(user_id)
+            message = self._pending[user_id][0]
+            try:
+                await self._send(user_id, message)
+            except asyncio.CancelledError:
+                self._busy.discard(user_id)
+                raise
+
+    async def _send(self, user_id: int, message: _Message) -> None:
+        message.attempts += 1
+        try:
+            await self.send(message.params)
+            self._finish(user_id, message, True)
+        except VKAPIError as e:
+            if (classify_error(e) != FATAL and message.attempts <= self.retries and not self._closing
+                    and (self.budget is None or self.budget.try_spend())):
+                self.retried += 1
+                delay = self.retry_delay * 2 ** (message.attempts - 1)
+                logger.warning(f"Повтор отправки сообщения {user_id} через {delay:.1f}с: {e}")
+                # Пользователь остается занятым - его следующие сообщения ждут повтора
+                asyncio.get_running_loop().call_later(delay, self._retry, user_id)
+                return
+            logger.error(f"VK API Error sending message: {e}")
+            self._finish(user_id, message, False)
+        except Exception as e:
+            logger.error(f"Unexpected error sending message: {e}")
+            self._finish(user_id, message, False)
+
+    def _retry(self, user_id: int) -> None:
+        self._busy.discard(user_id)
+        self._schedule(user_id)
+
+    def _finish(self, user_id: int, message: _Message, success: bool) -> None:
+        self._pending[user_id].popleft()
+        self._busy.discard(user_id)
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.max_wait = max(self.max_wait, time.monotonic() - message.queued_at)
+        if not message.future.done():
+            message.future.set_result(success)
+        self._schedule(user_id)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Дожидается отправки очереди (не дольше timeout) и останавливает обработчики"""
+        self._closing = True
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for messages in self._pending.values():
+            for message in messages:
+                if not message.future.done():
+                    message.future.set_result(False)
+        self._pending.clear()
+        self._scheduled.clear()
+        self._ready.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'queued': len(self),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'max_wait': round(self.max_wait, 3)
+        }
@@ -2,8 +2,11 @@
 Фабрика для создания и управления сервисами
 """
 
+from config.settings import config
 from database.repository import DatabaseRepository
 from services.vk_service import VKService
+from services.async_vk_service import AsyncVKService
+from services.threaded_vk_service import ThreadedVKService
 from services.user_service import UserService
 from services.search_service import SearchService
 from services.favorite_service import FavoriteService
@@ -24,10 +27,27 @@ class ServiceFactory:
         return cls._instance
 
     @classmethod
-    def get_vk_service(cls) -> VKService:
-        """Возвращает экземпляр VKService"""
+    def configure(cls, vk_service=None, db_repository=None) -> None:
+        """
+        Подменяет VK-сервис и/или репозиторий (например, заглушками
+        для воспроизведения событий); зависящие сервисы создаются заново
+        """
+        if vk_service is not None:
+            cls._vk_service = vk_service
+        if db_repository is not None:
+            cls._db_repository = db_repository
+        cls._user_service = None
+        cls._search_service = None
+        cls._favorite_service = None
+
+    @classmethod
+    def get_vk_service(cls) -> AsyncVKService:
+        """Возвращает экземпляр AsyncVKService (VK_CLIENT=threaded - ThreadedVKService)"""
         if cls._vk_service is None:
-            cls._vk_service = VKService()
+            if config.VK.CLIENT == 'threaded':
+                cls._vk_service = ThreadedVKService()
+            else:
+                cls._vk_service = AsyncVKService()
         return cls._vk_service
 
     @classmethod
@@ -69,6 +89,8 @@ class ServiceFactory:
     @classmethod
     async def shutdown(cls):
         """Корректно завершает работу всех сервисов"""
+        if cls._vk_service:
+            await cls._vk_service.close()
         if cls._db_repository:
             cls._db_repository.close()
 
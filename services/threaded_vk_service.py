@@ -0,0 +1,136 @@
+"""
+AsyncVKService поверх vk_api: блокирующие вызовы выполняются в пуле потоков
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+import vk_api
+from requests.adapters import HTTPAdapter
+from vk_api.exceptions import ApiError, VkApiError
+
+from config.settings import config
+from services.async_vk_service import AsyncVKService
+from services.vk_client import prepare_params
+from utils import VKAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter с таймаутом по умолчанию: vk_api не передает timeout в requests"""
+
+    def __init__(self, timeout: float, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class ThreadedVKService(AsyncVKService):
+    """
+    Методы AsyncVKService, выполняемые через vk_api в ограниченном пуле потоков.
+
+    У каждого потока своя requests.Session и свои VkApi: у VkApi внутренняя
+    блокировка на экземпляр, поэтому общий экземпляр снова выстроил бы все
+    вызовы в очередь. Вызовы сверх размера пула ждут в цикле событий, а не в
+    очереди пула: вызов, отмененный до начала, поток не занимает. Запрос,
+    уже начатый в потоке, прервать нельзя - его место в пуле освобождается,
+    только когда поток закончит, даже если вызывающий уже отменен.
+    """
+
+    def __init__(self, max_workers: int = None):
+        super().__init__()
+        self.max_workers = max_workers or config.VK.THREAD_POOL_SIZE
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='vk-api')
+        self._semaphore = None
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+
+    def _create_client(self) -> None:
+        # HTTP-запросы выполняет vk_api, aiohttp-клиент не нужен
+        return None
+
+    def _create_http_session(self) -> requests.Session:
+        session = requests.Session()
+        # Поток выполняет один запрос за раз - держим keep-alive соединения
+        # с api.vk.com/api.vk.ru, без запаса, который никогда не используется
+        adapter = _TimeoutHTTPAdapter(
+            timeout=config.VK.API_TIMEOUT,
+            pool_connections=2,
+            pool_maxsize=2,
+            max_retries=0
+        )
+        session.mount('https://', adapter)
+        with self._sessions_lock:
+            self._sessions.append(session)
+        return session
+
+    def _get_vk(self, token: str) -> vk_api.VkApi:
+        """VkApi текущего потока для токена"""
+        sessions = getattr(self._local, 'vk', None)
+        if sessions is None:
+            sessions = self._local.vk = {}
+            self._local.http = self._create_http_session()
+
+        vk = sessions.get(token)
+        if vk is None:
+            vk = sessions[token] = vk_api.VkApi(
+                token=token,
+                api_version=config.VK.API_VERSION,
+                session=self._local.http
+            )
+        return vk
+
+    def _request_sync(self, token: str, method: str, params: Dict[str, Any]) -> Any:
+        """Выполняется в потоке пула"""
+        try:
+            return self._get_vk(token).method(method, prepare_params(params))
+        except ApiError as e:
+            raise VKAPIError(f"VK API error in {method}: {e}", e.code) from e
+        except VkApiError as e:
+            raise VKAPIError(f"VK API error in {method}: {e}") from e
+        except requests.Timeout as e:
+            raise VKAPIError(f"Request timeout in {method}") from e
+        except requests.RequestException as e:
+            raise VKAPIError(f"Network error in {method}: {e}") from e
+
+    async def _request(self, token: str, method: str, params: Dict[str, Any]) -> Any:
+        """Выполняет запрос к VK API в пуле потоков"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._request_sync, token, method, params)
+        future.add_done_callback(self._release_slot)
+        # Отмена вызывающего не отменяет запрос в потоке: слот остается занятым до его конца
+        return await asyncio.shield(future)
+
+    def _release_slot(self, future: asyncio.Future) -> None:
+        self._semaphore.release()
+        if not future.cancelled():
+            # Ошибку отмененного вызова никто не заберет - не пишем ее в лог как потерянную
+            future.exception()
+
+    async def close(self) -> None:
+        """
+        Отправляет оставшиеся сообщения, дожидается выполняющихся вызовов и
+        закрывает HTTP-сессии потоков
+        """
+        # Очередь отправки выполняет messages.send в пуле - сначала она
+        await super().close()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
@@ -17,14 +17,14 @@ class UserService:
         self.db_repository = db_repository
         self.vk_service = vk_service
 
-    def process_user(self, user_id: int):
+    async def process_user(self, user_id: int):
         """Обрабатывает пользователя: получает и сохраняет информацию"""
         # Сначала проверяем, есть ли пользователь в базе данных
         existing_user = self.db_repository.get_user_by_vk_id(user_id)
         logger.info(f"Existing user from DB: {existing_user}")
         
         # Получаем актуальные данные из VK API
-        vk_user_info = self.vk_service.get_user_info(user_id)
+        vk_user_info = await self.vk_service.get_user_info(user_id)
         if not vk_user_info:
             return existing_user if existing_user else None
         
@@ -52,7 +52,7 @@ class UserService:
 
         return vk_user_info
 
-    def find_next_match(self, user_id: int, user_info) -> Optional[Dict[str, Any]]:
+    async def find_next_match(self, user_id: int, user_info) -> Optional[Dict[str, Any]]:
         """Находит следующего подходящего пользователя"""
         if not user_info.age or not user_info.city or not user_info.sex:
             return None
@@ -61,39 +61,47 @@ class UserService:
         viewed_users = self.db_repository.get_viewed_users(user_id)
 
         # Ищем новых пользователей
-        found_users = self.vk_service.search_users(
+        found_users = await self.vk_service.search_users(
             user_info.age, user_info.sex, user_info.city, len(viewed_users)
         )
 
-        for user in found_users:
-            if user['id'] not in viewed_users:
-                # Получаем фотографии
-                photos = self.vk_service.get_top_photos(user['id'])
-
-                if photos:
-                    # Сохраняем найденного пользователя
-                    found_user_data = {
-                        'vk_id': user['id'],
-                        'first_name': user.get('first_name', ''),
-                        'last_name': user.get('last_name', ''),
-                        'age': user_info.age,
-                        'city': user_info.city,
-                        'sex': user_info.sex,
-                        'profile_link': self.create_profile_link(user['id'], user.get('domain'))
-                    }
-
-                    self.add_found_user(found_user_data)
-                    
-                    # Сохраняем фотографии пользователя
-                    self.db_repository.add_user_photos(user['id'], photos)
-
-                    # Добавляем в просмотренные
-                    self.db_repository.add_to_viewed(user_id, user['id'])
-
-                    return {
-                        'user': found_user_data,
-                        'photos': photos
-                    }
+        candidates = [user for user in found_users if user['id'] not in viewed_users]
+
+        # Соседние страницы поиска пересекаются - фотографии многих кандидатов уже в кэше
+        photos_by_user = self.vk_service.get_cached_top_photos([user['id'] for user in candidates])
+
+        for index, user in enumerate(candidates):
+            if user['id'] not in photos_by_user:
+                # Фотографии получаем пачкой: до 25 кандидатов за один запрос execute
+                batch = candidates[index:index + self.vk_service.EXECUTE_BATCH_SIZE]
+                photos_by_user.update(await self.vk_service.get_top_photos_batch([c['id'] for c in batch]))
+
+            photos = photos_by_user.get(user['id'])
+
+            if photos:
+                # Сохраняем найденного пользователя
+                found_user_data = {
+                    'vk_id': user['id'],
+                    'first_name': user.get('first_name', ''),
+                    'last_name': user.get('last_name', ''),
+                    'age': user_info.age,
+                    'city': user_info.city,
+                    'sex': user_info.sex,
+                    'profile_link': self.create_profile_link(user['id'], user.get('domain'))
+                }
+
+                self.add_found_user(found_user_data)
+                
+                # Сохраняем фотографии пользователя
+                self.db_repository.add_user_photos(user['id'], photos)
+
+                # Добавляем в просмотренные
+                self.db_repository.add_to_viewed(user_id, user['id'])
+
+                return {
+                    'user': found_user_data,
+                    'photos': photos
+                }
 
         return None
 
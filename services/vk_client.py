@@ -0,0 +1,100 @@
+"""
+Асинхронный HTTP-клиент VK API на aiohttp
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from config.settings import config
+from utils import VKAPIError
+
+logger = logging.getLogger(__name__)
+
+VK_API_URL = 'https://api.vk.com/method/'
+
+
+def prepare_params(params: Dict[str, Any]) -> Dict[str, str]:
+    """Приводит параметры вызова к строкам: списки VK принимает через запятую"""
+    prepared = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = ','.join(str(item) for item in value)
+        elif isinstance(value, bool):
+            value = int(value)
+        prepared[key] = str(value)
+    return prepared
+
+
+class AsyncVKClient:
+    """
+    Вызывает методы VK API через одну ClientSession.
+
+    Соединения с api.vk.com переиспользуются (keep-alive) из пула размером
+    pool_size; у каждого вызова свой таймаут. Ответ с полем error
+    превращается в VKAPIError с кодом ошибки VK (error.code).
+    """
+
+    def __init__(self, api_version: str = None, timeout: float = None,
+                 pool_size: int = None, base_url: str = VK_API_URL):
+        self.api_version = api_version or config.VK.API_VERSION
+        self.timeout = timeout or config.VK.API_TIMEOUT
+        self.pool_size = pool_size or config.VK.HTTP_POOL_SIZE
+        self.base_url = base_url
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессия создается в работающем цикле событий - при первом вызове
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def call(self, method: str, params: Dict[str, Any], token: str,
+                   timeout: Optional[float] = None) -> Any:
+        """Вызывает метод VK API и возвращает поле response"""
+        data = prepare_params(params)
+        data.setdefault('v', self.api_version)
+        data['access_token'] = token
+
+        try:
+            # POST: текст сообщений и клавиатуры не упираются в длину URL
+            async with self._get_session().post(
+                self.base_url + method,
+                data=data,
+                timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+            ) as response:
+                if response.status != 200:
+                    raise VKAPIError(f"HTTP error {response.status} in {method}", status=response.status)
+                body = await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise VKAPIError(f"Request timeout in {method}")
+        except aiohttp.ClientError as e:
+            raise VKAPIError(f"Network error in {method}: {e}")
+        except json.JSONDecodeError as e:
+            raise VKAPIError(f"JSON decode error in {method}: {e}")
+
+        if not isinstance(body, dict):
+            raise VKAPIError(f"Unexpected response in {method}: {type(body).__name__}")
+        if 'error' in body:
+            error = body['error'] if isinstance(body['error'], dict) else {}
+            raise VKAPIError(
+                f"VK API error in {method}: {error.get('error_msg', 'Unknown VK error')}",
+                error.get('error_code')
+            )
+        return body.get('response')
+
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию и пул соединений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,73 @@
+"""
+Хеджирование медленных вызовов VK API на чтение
+"""
+
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from services.vk_retry import RetryBudget
+
+logger = logging.getLogger(__name__)
+
+
+def parse_methods(value: str) -> set:
+    """Разбирает список методов через запятую"""
+    return {method.strip() for method in value.split(',') if method.strip()}
+
+
+class Hedger:
+    """
+    Решает, когда дублировать вызов одного метода: если ответа нет дольше
+    наблюдаемого перцентиля задержки (p95 последних window вызовов), второй
+    такой же запрос уходит параллельно, и берется первый ответ. Доля
+    дублей ограничена budget_percent процентами вызовов
+    """
+
+    MIN_SAMPLES = 50
+
+    def __init__(self, percentile: float = 95.0, budget_percent: float = 5.0,
+                 window: int = 500, min_delay: float = 0.05):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._threshold: Optional[float] = None
+        self._since_update = 0
+        self.budget = RetryBudget(ratio=budget_percent / 100, min_per_second=0.0, max_balance=10.0)
+
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def observe(self, latency: float) -> None:
+        """Учитывает время успешного вызова (с точки зрения вызывающего)"""
+        self._latencies.append(latency)
+        self._since_update += 1
+        # Перцентиль пересчитывается не на каждый вызов
+        if self._threshold is None or self._since_update >= 50:
+            self._since_update = 0
+            if len(self._latencies) >= self.MIN_SAMPLES:
+                ordered = sorted(self._latencies)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                self._threshold = max(self.min_delay, ordered[index])
+
+    def delay(self) -> Optional[float]:
+        """Через сколько секунд дублировать вызов (None - пока мало данных)"""
+        self.calls += 1
+        self.budget.record_call()
+        return self._threshold
+
+    def try_hedge(self) -> bool:
+        """Можно ли отправить дубль (и списывает его из бюджета)"""
+        if self.budget.try_spend():
+            self.hedged += 1
+            return True
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'threshold': round(self._threshold, 3) if self._threshold is not None else None,
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'wins': self.hedge_wins
+        }
@@ -0,0 +1,84 @@
+"""
+Лимиты частоты запросов к VK API: по токенам и по методам
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+from utils import RateLimitBackend, RateLimiter, SharedRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def token_key(token: str) -> str:
+    """Ключ токена в хранилище лимитов: сам токен никуда не записывается"""
+    return hashlib.sha1(token.encode()).hexdigest()
+
+
+def parse_method_limits(value: str) -> Dict[str, float]:
+    """Разбирает строку вида 'users.search=1,photos.get=2.5' (запросов в секунду)"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        method, _, rps = item.partition('=')
+        try:
+            limits[method.strip()] = float(rps)
+        except ValueError:
+            logger.warning(f"Некорректный лимит метода VK API: '{item}'")
+    return {method: rps for method, rps in limits.items() if rps > 0}
+
+
+class VKRateLimits:
+    """
+    Лимиты на токен (у каждого токена свой RateLimiter) и, при необходимости,
+    на отдельные методы. Один экземпляр на процесс: все сервисы, которые
+    ходят в VK через AsyncVKService, делят одни и те же лимиты.
+
+    С backend (например, FileRateLimitBackend) лимиты делят и все процессы,
+    использующие то же хранилище: ключ токена - его хеш, поэтому общий лимит
+    получают только процессы с одним и тем же токеном.
+    """
+
+    def __init__(self, method_limits: Optional[Dict[str, float]] = None, burst: int = 1,
+                 backend: Optional[RateLimitBackend] = None):
+        self.burst = burst
+        self.backend = backend
+        self._tokens: Dict[str, Union[RateLimiter, SharedRateLimiter]] = {}
+        self._labels: Dict[str, str] = {}
+        self._methods = {
+            method: self.create_limiter(f'method:{method}', rps)
+            for method, rps in (method_limits or {}).items()
+        }
+
+    def create_limiter(self, key: str, rps: float) -> Union[RateLimiter, SharedRateLimiter]:
+        """Лимитер в том же хранилище (общий для процессов, если хранилище общее)"""
+        if self.backend is None:
+            return RateLimiter(rps, 1.0, self.burst)
+        return SharedRateLimiter(self.backend, key, rps, 1.0, self.burst)
+
+    def add_token(self, token: str, rps: float, label: str) -> None:
+        """Регистрирует токен; label - имя токена в статистике (сам токен не выводится)"""
+        if token and rps > 0:
+            self._tokens[token] = self.create_limiter('token:' + token_key(token), rps)
+            self._labels[token] = label
+
+    def limiters(self, token: str, method: str) -> List[Union[RateLimiter, SharedRateLimiter]]:
+        return [
+            limiter for limiter in (self._methods.get(method), self._tokens.get(token))
+            if limiter is not None
+        ]
+
+    async def acquire(self, token: str, method: str) -> None:
+        """Ждет, пока вызов method с токеном token уложится во все лимиты"""
+        for limiter in self.limiters(token, method):
+            await limiter.acquire()
+
+    async def penalize(self, token: str, method: str, seconds: float) -> None:
+        """Приостанавливает вызовы с токеном (и метода, если у него свой лимит)"""
+        for limiter in self.limiters(token, method):
+            await limiter.penalize(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {self._labels[token]: limiter.get_stats() for token, limiter in self._tokens.items()}
+        stats.update({method: limiter.get_stats() for method, limiter in self._methods.items()})
+        return stats
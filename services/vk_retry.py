@@ -0,0 +1,194 @@
+"""
+Повторы вызовов VK API: классификация ошибок, бюджет повторов и
+автоматические выключатели (circuit breaker) по методам
+"""
+
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+from utils import VKAPIError
+
+logger = logging.getLogger(__name__)
+
+# Виды ошибок
+FLOOD = 'flood'          # превышен лимит: повторить позже и снизить частоту
+TRANSIENT = 'transient'  # сеть, таймаут, 5xx, внутренняя ошибка VK: повторить
+FATAL = 'fatal'          # повтор не поможет
+
+# 6 - слишком много запросов в секунду, 9 - слишком много однотипных действий
+FLOOD_ERRORS = {6, 9}
+# 1 - неизвестная ошибка, 10 - внутренняя ошибка сервера
+TRANSIENT_ERRORS = {1, 10}
+# HTTP 429 Too Many Requests - тот же лимит частоты
+HTTP_TOO_MANY_REQUESTS = 429
+
+
+class CircuitOpenError(VKAPIError):
+    """Вызов не выполнялся: выключатель метода разомкнут после серии ошибок"""
+    pass
+
+
+def classify_error(error: VKAPIError) -> str:
+    """
+    Вид ошибки VK API. Ошибки без кода - сетевые, таймауты и HTTP 5xx.
+    HTTP 4xx (неверный запрос, кроме 429) и остальные коды (5 - авторизация,
+    15 - доступ запрещен, 30 - приватный профиль, 29 - исчерпан суточный
+    лимит метода и т.д.) не повторяются
+    """
+    if isinstance(error, CircuitOpenError):
+        return FATAL
+    status = error.status
+    if status == HTTP_TOO_MANY_REQUESTS:
+        return FLOOD
+    if status is not None and 400 <= status < 500:
+        return FATAL
+    if error.code is None or error.code in TRANSIENT_ERRORS:
+        return TRANSIENT
+    if error.code in FLOOD_ERRORS:
+        return FLOOD
+    return FATAL
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Экспоненциальная задержка с полным джиттером: повторы не приходят волной"""
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """
+    Общий бюджет повторов: каждый вызов добавляет ratio повтора, каждый
+    повтор тратит один; плюс min_per_second повторов в секунду независимо
+    от трафика. При сбое VK повторы не умножают нагрузку больше чем на (1 + ratio)
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, max_balance: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = max_balance
+        self._updated = time.monotonic()
+
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self, amount: float = 0.0) -> None:
+        now = time.monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self._balance = min(self.max_balance, self._balance + amount)
+
+    def record_call(self) -> None:
+        """Учитывает первую попытку вызова"""
+        self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        """Можно ли выполнить повтор (и списывает его из бюджета)"""
+        self._refill()
+        if self._balance >= 1:
+            self._balance -= 1
+            self.spent += 1
+            return True
+        self.denied += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'spent': self.spent,
+            'denied': self.denied,
+            'balance': round(self._balance, 1)
+        }
+
+
+class CircuitBreaker:
+    """
+    Выключатель одного метода: после failures ошибок подряд размыкается на
+    open_for секунд - вызовы сразу получают CircuitOpenError. Затем пропускает
+    один пробный вызов: успех замыкает выключатель, ошибка размыкает снова
+    """
+
+    def __init__(self, failures: int = 5, open_for: float = 30.0):
+        self.failures = failures
+        self.open_for = open_for
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() - self._opened_at < self.open_for:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов сейчас"""
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open':
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._consecutive += 1
+        if self._probing or (self._opened_at is None and self._consecutive >= self.failures):
+            self._opened_at = time.monotonic()
+            self._probing = False
+            self.opened += 1
+
+    def release(self) -> None:
+        """Пробный вызов завершился без ответа VK (например, отменен)"""
+        self._probing = False
+
+
+class RetryPolicy:
+    """Бюджет повторов и выключатели методов, общие для всех вызовов сервиса"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 5.0,
+                 budget: Optional[RetryBudget] = None, breaker_failures: int = 5,
+                 breaker_open_for: float = 30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker_failures = breaker_failures
+        self.breaker_open_for = breaker_open_for
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, method: str) -> CircuitBreaker:
+        breaker = self._breakers.get(method)
+        if breaker is None:
+            breaker = self._breakers[method] = CircuitBreaker(self.breaker_failures, self.breaker_open_for)
+        return breaker
+
+    def retry_delay(self, kind: str, attempt: int) -> Optional[float]:
+        """
+        Через сколько секунд повторить попытку attempt (с 1), или None, если
+        повторять нельзя: ошибка не повторяемая, попытки или бюджет исчерпаны
+        """
+        if kind == FATAL or attempt >= self.attempts or not self.budget.try_spend():
+            return None
+        if kind == FLOOD:
+            # Лимит VK считается по секундам - ждем не меньше секунды
+            return max(1.0, backoff_delay(attempt, self.base_delay * 5, self.max_delay))
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'budget': self.budget.get_stats(),
+            'open': sorted(method for method, breaker in self._breakers.items() if breaker.state != 'closed'),
+            'rejected': sum(breaker.rejected for breaker in self._breakers.values())
+        }
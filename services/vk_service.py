@@ -1,7 +1,8 @@
 import logging
+import time
 import vk_api
 from vk_api.exceptions import VkApiError
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Union
 
 from config.settings import config
 from database.models import VKUser
@@ -10,8 +11,29 @@ from utils import VKAPIError
 
 logger = logging.getLogger(__name__)
 
+# photos.get для нескольких пользователей в одном execute; возвращаются
+# только id и лайки фотографий - остальные поля для выбора топа не нужны
+PHOTOS_EXECUTE_CODE = """var ids = [%s];
+var result = [];
+var i = 0;
+while (i < ids.length) {
+    var r = API.photos.get({"owner_id": ids[i], "album_id": "profile", "extended": 1, "count": 100});
+    if (r) {
+        result.push({"ids": r.items@.id, "likes": r.items@.likes});
+    } else {
+        result.push(false);
+    }
+    i = i + 1;
+}
+return result;"""
+
 
 class VKService:
+    # VK выполняет не более 25 вызовов API в одном execute
+    EXECUTE_BATCH_SIZE = 25
+    # users.get принимает не более 1000 id
+    USERS_GET_BATCH_SIZE = 1000
+
     def __init__(self):
         self.user_session = vk_api.VkApi(token=config.VK.USER_TOKEN)
         self.user_vk = self.user_session.get_api()
@@ -19,42 +41,175 @@ class VKService:
         self.group_session = vk_api.VkApi(token=config.VK.GROUP_TOKEN)
         self.group_vk = self.group_session.get_api()
 
+        # utils.EventRecorder для записи вызовов API (включается в app.py)
+        self.recorder = None
+
         # Проверяем токены
         self._validate_tokens()
-        
-    def get_user_info(self, user_id: int) -> Optional[VKUser]:
-        """Получает информацию о пользователе ВКонтакте"""
-        try:
-            response = self.group_vk.users.get(
-                user_ids=user_id,
-                fields='city,sex,bdate,domain',
-                lang='ru'
-            )
 
-            if not response:
-                return None
+    # Параметры запросов и разбор ответов общие для синхронного и асинхронного клиентов
 
-            user_data = response[0]
+    def _user_info_params(self, user_id: Union[int, List[int]]) -> Dict[str, Any]:
+        return {
+            'user_ids': user_id,
+            'fields': 'city,sex,bdate,domain',
+            'lang': 'ru'
+        }
 
-            # Извлекаем возраст из даты рождения
-            age = self._calculate_age(user_data.get('bdate'))
+    def _parse_user_info(self, user_id: int, response: Any) -> Optional[VKUser]:
+        if not response:
+            return None
 
-            # Извлекаем город
-            city = user_data.get('city', {}).get('title') if isinstance(user_data.get('city'), dict) else user_data.get('city')
+        user_data = response[0]
+
+        # Извлекаем возраст из даты рождения
+        age = self._calculate_age(user_data.get('bdate'))
+
+        # Извлекаем город
+        city = user_data.get('city', {}).get('title') if isinstance(user_data.get('city'), dict) else user_data.get('city')
+
+        # Формируем ссылку на профиль
+        domain = user_data.get('domain', f'id{user_id}')
+        profile_link = f'https://vk.com/{domain}'
+
+        return VKUser(
+            vk_id=user_id,
+            first_name=user_data.get('first_name', ''),
+            last_name=user_data.get('last_name', ''),
+            age=age,
+            city=city,
+            sex=user_data.get('sex', 0),
+            profile_link=profile_link
+        )
+
+    def _city_params(self, city_name: str) -> Dict[str, Any]:
+        return {
+            'country_id': 1,  # Россия
+            'q': city_name,
+            'count': 1
+        }
+
+    def _parse_city_id(self, response: Any) -> Optional[int]:
+        cities = response.get('items', [])
+        if cities:
+            return cities[0]['id']
+        return None
 
-            # Формируем ссылку на профиль
-            domain = user_data.get('domain', f'id{user_id}')
-            profile_link = f'https://vk.com/{domain}'
-            
-            return VKUser(
-                vk_id=user_id,
-                first_name=user_data.get('first_name', ''),
-                last_name=user_data.get('last_name', ''),
-                age=age,
-                city=city,
-                sex=user_data.get('sex', 0),
-                profile_link=profile_link
-            )
+    def _search_params(self, age: int, sex: int, city_id: int, offset: int) -> Dict[str, Any]:
+        # Определяем пол для поиска (инвертируем)
+        search_sex = 1 if sex == 2 else 2 if sex == 1 else 0
+
+        # Вычисляем возрастные границы
+        age_from = max(18, age - config.VK.MAX_AGE_DIFFERENCE)
+        age_to = min(100, age + config.VK.MAX_AGE_DIFFERENCE)
+
+        return {
+            'count': config.VK.SEARCH_LIMIT,
+            'offset': offset,
+            'age_from': age_from,
+            'age_to': age_to,
+            'sex': search_sex,
+            'city': city_id,
+            'has_photo': 1,
+            'fields': 'is_closed,can_access_closed,domain',
+            'v': config.VK.API_VERSION
+        }
+
+    def _parse_search(self, response: Any) -> List[Dict[str, Any]]:
+        # Фильтруем только открытые профили
+        return [
+            user for user in response.get('items', [])
+            if not user.get('is_closed', True) and user.get('can_access_closed', False)
+        ]
+
+    def _photos_params(self, user_id: int) -> Dict[str, Any]:
+        return {
+            'owner_id': user_id,
+            'album_id': 'profile',
+            'extended': 1,
+            'count': 100,
+            'v': config.VK.API_VERSION
+        }
+
+    def _parse_top_photos(self, response: Any) -> List[Tuple[str, int]]:
+        if not response or 'items' not in response:
+            return []
+
+        # Сортируем фотографии по количеству лайков
+        sorted_photos = sorted(
+            response['items'],
+            key=lambda x: x.get('likes', {}).get('count', 0),
+            reverse=True
+        )
+
+        # Берем топ-3 фотографии
+        top_photos = sorted_photos[:config.VK.PHOTOS_LIMIT]
+
+        # Формируем список в формате (attachment_string, likes_count)
+        result = []
+        for photo in top_photos:
+            attachment_str = f"photo{photo['owner_id']}_{photo['id']}"
+            likes_count = photo.get('likes', {}).get('count', 0)
+            result.append((attachment_str, likes_count))
+
+        return result
+
+    def _photos_execute_code(self, user_ids: List[int]) -> str:
+        """VKScript для execute: photos.get по каждому id"""
+        return PHOTOS_EXECUTE_CODE % ','.join(str(int(user_id)) for user_id in user_ids)
+
+    def _parse_top_photos_batch(self, user_ids: List[int], response: Any) -> Dict[int, List[Tuple[str, int]]]:
+        """Разбирает ответ execute из _photos_execute_code"""
+        result = {}
+        for user_id, item in zip(user_ids, response or []):
+            # false - закрытый профиль или ошибка photos.get для этого пользователя
+            if not item:
+                result[user_id] = []
+                continue
+            photos = [
+                {'owner_id': user_id, 'id': photo_id, 'likes': likes or {}}
+                for photo_id, likes in zip(item.get('ids') or [], item.get('likes') or [])
+            ]
+            result[user_id] = self._parse_top_photos({'items': photos})
+        return result
+
+    def _message_params(self, user_id: int, message: str,
+                        keyboard: Optional[str] = None,
+                        attachment: Optional[str] = None) -> Dict[str, Any]:
+        params = {
+            'user_id': user_id,
+            'message': message,
+            'random_id': 0,
+            'v': config.VK.API_VERSION
+        }
+
+        if keyboard:
+            params['keyboard'] = keyboard
+
+        if attachment:
+            params['attachment'] = attachment
+
+        return params
+
+    def _call(self, session: vk_api.VkApi, method: str, params: Dict[str, Any]) -> Any:
+        """Вызывает метод VK API через сессию (и записывает вызов, если включена запись)"""
+        started = time.monotonic()
+        try:
+            response = session.method(method, params)
+        except Exception as e:
+            if self.recorder is not None:
+                self.recorder.record_api_call(method, params, time.monotonic() - started, error=str(e))
+            raise
+
+        if self.recorder is not None:
+            self.recorder.record_api_call(method, params, time.monotonic() - started, response)
+        return response
+        
+    def get_user_info(self, user_id: int) -> Optional[VKUser]:
+        """Получает информацию о пользователе ВКонтакте"""
+        try:
+            response = self._call(self.group_session, 'users.get', self._user_info_params(user_id))
+            return self._parse_user_info(user_id, response)
 
         except VkApiError as e:
             logger.error(f"VK API Error getting user info: {e}")
@@ -67,16 +222,8 @@ class VKService:
         """Получает ID города по названию"""
         try:
             # Используем пользовательский токен для получения ID города
-            response = self.user_vk.database.getCities(
-                country_id=1,  # Россия
-                q=city_name,
-                count=1
-            )
-            
-            cities = response.get('items', [])
-            if cities:
-                return cities[0]['id']
-            return None
+            response = self._call(self.user_session, 'database.getCities', self._city_params(city_name))
+            return self._parse_city_id(response)
             
         except VkApiError as e:
             logger.error(f"VK API Error getting city ID: {e}")
@@ -88,38 +235,14 @@ class VKService:
     def search_users(self, age: int, sex: int, city: str, offset: int = 0) -> List[Dict[str, Any]]:
         """Ищет пользователей по критериям"""
         try:
-            # Определяем пол для поиска (инвертируем)
-            search_sex = 1 if sex == 2 else 2 if sex == 1 else 0
-            
-            # Вычисляем возрастные границы
-            age_from = max(18, age - config.VK.MAX_AGE_DIFFERENCE)
-            age_to = min(100, age + config.VK.MAX_AGE_DIFFERENCE)
-            
             # Получаем ID города
             city_id = self.get_city_id(city)
             if not city_id:
                 logger.warning(f"Could not find city ID for: {city}")
                 return []
             
-            response = self.user_vk.users.search(
-                count=config.VK.SEARCH_LIMIT,
-                offset=offset,
-                age_from=age_from,
-                age_to=age_to,
-                sex=search_sex,
-                city=city_id,
-                has_photo=1,
-                fields='is_closed,can_access_closed,domain',
-                v=config.VK.API_VERSION
-            )
-
-            # Фильтруем только открытые профили
-            open_profiles = [
-                user for user in response.get('items', [])
-                if not user.get('is_closed', True) and user.get('can_access_closed', False)
-            ]
-
-            return open_profiles
+            response = self._call(self.user_session, 'users.search', self._search_params(age, sex, city_id, offset))
+            return self._parse_search(response)
 
         except VkApiError as e:
             logger.error(f"VK API Error searching users: {e}")
@@ -149,35 +272,8 @@ class VKService:
     def get_top_photos(self, user_id: int) -> List[Tuple[str, int]]:
         """Получает топ-3 фотографии пользователя по лайкам"""
         try:
-            response = self.user_vk.photos.get(
-                owner_id=user_id,
-                album_id='profile',
-                extended=1,
-                count=100,
-                v=config.VK.API_VERSION
-            )
-
-            if not response or 'items' not in response:
-                return []
-
-            # Сортируем фотографии по количеству лайков
-            sorted_photos = sorted(
-                response['items'],
-                key=lambda x: x.get('likes', {}).get('count', 0),
-                reverse=True
-            )
-
-            # Берем топ-3 фотографии
-            top_photos = sorted_photos[:config.VK.PHOTOS_LIMIT]
-
-            # Формируем список в формате (attachment_string, likes_count)
-            result = []
-            for photo in top_photos:
-                attachment_str = f"photo{photo['owner_id']}_{photo['id']}"
-                likes_count = photo.get('likes', {}).get('count', 0)
-                result.append((attachment_str, likes_count))
-
-            return result
+            response = self._call(self.user_session, 'photos.get', self._photos_params(user_id))
+            return self._parse_top_photos(response)
             
         except VkApiError as e:
             logger.error(f"VK API Error getting photos: {e}")
@@ -191,20 +287,8 @@ class VKService:
                      attachment: Optional[str] = None) -> bool:
         """Отправляет сообщение пользователю"""
         try:
-            params = {
-                'user_id': user_id,
-                'message': message,
-                'random_id': 0,
-                'v': config.VK.API_VERSION
-            }
-
-            if keyboard:
-                params['keyboard'] = keyboard
-
-            if attachment:
-                params['attachment'] = attachment
-
-            self.group_vk.messages.send(**params)
+            params = self._message_params(user_id, message, keyboard, attachment)
+            self._call(self.group_session, 'messages.send', params)
             return True
 
         except VkApiError as e:
@@ -0,0 +1,180 @@
+"""
+Пул токенов пользователя для методов VK API, которые вызываются от имени пользователя
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import VKAPIError
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, относящиеся к конкретному токену: на другом токене вызов может пройти
+AUTH_ERROR = 5          # авторизация не удалась: токен отозван или истек
+METHOD_LIMIT_ERROR = 29  # исчерпан суточный лимит метода - только этого метода
+# На сколько секунд токен выводится из пула
+TOKEN_QUARANTINE = {
+    6: 1.0,   # слишком много запросов в секунду
+    9: 60.0,  # слишком много однотипных действий
+}
+METHOD_QUARANTINE = 3600.0
+
+# Отключенный токен проверяется снова через DISABLE_RECHECK секунд,
+# после каждой новой ошибки авторизации - вдвое позже (до DISABLE_RECHECK_MAX)
+DISABLE_RECHECK = 300.0
+DISABLE_RECHECK_MAX = 6 * 3600.0
+
+
+def parse_tokens(primary: Optional[str], extra: str) -> List[str]:
+    """Основной токен и дополнительные через запятую, без повторов"""
+    tokens = []
+    for token in [primary or ''] + extra.split(','):
+        token = token.strip()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+class _TokenState:
+    __slots__ = ('label', 'in_flight', 'calls', 'errors', 'quarantined_until',
+                 'disabled_until', 'recheck')
+
+    def __init__(self, label: str):
+        self.label = label
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.quarantined_until = 0.0
+        # Отключен (ошибка авторизации) до этого времени, затем - пробный вызов
+        self.disabled_until = 0.0
+        self.recheck = DISABLE_RECHECK
+
+
+class TokenPool:
+    """
+    Распределяет вызовы между токенами: выбирается здоровый токен с наименьшим
+    числом выполняющихся и ждущих лимита вызовов, то есть с наибольшим
+    запасом квоты. Токен, упершийся в лимит частоты, выводится из пула на
+    время; исчерпанный суточный лимит метода выводит токен только для этого
+    метода. Отозванный токен отключается и через DISABLE_RECHECK секунд
+    пробуется снова: его могли перевыпустить или восстановить. Если здоровых
+    токенов нет, берется тот, который освободится раньше всех: вызов лучше
+    попробовать, чем сразу отказать
+    """
+
+    def __init__(self, tokens: List[str]):
+        self._states: Dict[str, _TokenState] = {
+            token: _TokenState(f'user{index + 1}' if len(tokens) > 1 else 'user')
+            for index, token in enumerate(tokens)
+        }
+        # (токен, метод) -> до какого времени метод недоступен токену
+        self._method_quarantine: Dict[Tuple[str, str], float] = {}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._states
+
+    @property
+    def tokens(self) -> List[str]:
+        return list(self._states)
+
+    def label(self, token: str) -> str:
+        return self._states[token].label
+
+    def _ready_at(self, token: str, method: Optional[str]) -> float:
+        """Когда токен можно использовать для method"""
+        state = self._states[token]
+        ready = max(state.quarantined_until, state.disabled_until)
+        if method is not None:
+            ready = max(ready, self._method_quarantine.get((token, method), 0.0))
+        return ready
+
+    def available(self, method: Optional[str] = None, exclude: Optional[str] = None) -> int:
+        """Сколько токенов (кроме exclude) сейчас можно использовать для method"""
+        now = time.monotonic()
+        return sum(
+            1 for token in self._states
+            if token != exclude and self._ready_at(token, method) <= now
+        )
+
+    def pick(self, method: Optional[str] = None) -> str:
+        now = time.monotonic()
+        healthy = [token for token in self._states if self._ready_at(token, method) <= now]
+        if healthy:
+            return min(healthy, key=lambda token: (self._states[token].in_flight, self._states[token].calls))
+        return min(self._states, key=lambda token: self._ready_at(token, method))
+
+    def begin(self, token: str) -> None:
+        state = self._states[token]
+        state.in_flight += 1
+        state.calls += 1
+
+    def end(self, token: str) -> None:
+        self._states[token].in_flight -= 1
+
+    def report_success(self, token: str) -> None:
+        """Токен ответил - если он был отключен, он снова в пуле"""
+        state = self._states[token]
+        if state.recheck != DISABLE_RECHECK:
+            logger.info(f"Токен {state.label} снова работает")
+            state.recheck = DISABLE_RECHECK
+
+    def report_error(self, token: str, method: str, error: VKAPIError) -> bool:
+        """Учитывает ошибку; True - ошибка касается только этого токена"""
+        state = self._states[token]
+        state.errors += 1
+        now = time.monotonic()
+
+        if error.code == AUTH_ERROR:
+            self.disable(token, str(error))
+        elif error.code == METHOD_LIMIT_ERROR:
+            key = (token, method)
+            if self._method_quarantine.get(key, 0.0) <= now:
+                logger.warning(
+                    f"Токен {state.label} исчерпал суточный лимит {method}, "
+                    f"метод выведен из пула на {METHOD_QUARANTINE:.0f}с"
+                )
+            self._method_quarantine[key] = now + METHOD_QUARANTINE
+        elif error.code in TOKEN_QUARANTINE:
+            quarantine = TOKEN_QUARANTINE[error.code]
+            if quarantine >= 60 and state.quarantined_until <= now:
+                logger.warning(f"Токен {state.label} выведен из пула на {quarantine:.0f}с: {error}")
+            state.quarantined_until = max(state.quarantined_until, now + quarantine)
+        else:
+            return False
+        return True
+
+    def disable(self, token: str, reason: str) -> None:
+        """Отключает токен до повторной проверки"""
+        state = self._states[token]
+        now = time.monotonic()
+        if state.disabled_until > now:
+            return
+        state.disabled_until = now + state.recheck
+        logger.error(f"Токен {state.label} отключен, проверим снова через {state.recheck:.0f}с: {reason}")
+        state.recheck = min(DISABLE_RECHECK_MAX, state.recheck * 2)
+
+    def is_disabled(self, token: str) -> bool:
+        return self._states[token].disabled_until > time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        stats = {}
+        for token, state in self._states.items():
+            limited = sorted(
+                method for (limited_token, method), until in self._method_quarantine.items()
+                if limited_token == token and until > now
+            )
+            stats[state.label] = {
+                'calls': state.calls,
+                'errors': state.errors,
+                'in_flight': state.in_flight,
+                'state': 'disabled' if state.disabled_until > now else (
+                    'quarantined' if state.quarantined_until > now else 'ok'
+                ),
+                'limited_methods': limited
+            }
+        return stats
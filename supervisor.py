@@ -0,0 +1,245 @@
+"""
+Многопроцессный режим VKinder Bot
+
+Процесс-супервизор принимает события (long poll или Callback API),
+отсекает повторы и раздает их N рабочим процессам по from_id через
+консистентное хеширование, поэтому события одного пользователя всегда
+попадают в один и тот же процесс. Упавшие процессы перезапускаются.
+
+python supervisor.py --workers 4
+"""
+
+import argparse
+import asyncio
+import bisect
+import gc
+import hashlib
+import logging
+import multiprocessing
+import signal
+import sys
+import traceback
+from typing import Any, Dict, List, Optional
+
+# app импортирует обработчики и сервисы: модули загружаются до fork, поэтому
+# рабочие процессы стартуют быстрее и разделяют страницы памяти с супервизором
+from app import VKinderBot, IS_WINDOWS
+from config.settings import config
+from handlers.deduplicator import EventDeduplicator
+from handlers.dispatcher import get_event_user_id
+from services.callback_service import CallbackServer
+from services.longpoll_service import LongPollService
+
+logger = logging.getLogger(__name__)
+
+
+class ConsistentHashRing:
+    """Кольцо консистентного хеширования с виртуальными узлами"""
+
+    def __init__(self, nodes: List[int], replicas: int = 100):
+        self._ring: Dict[int, int] = {}
+        for node in nodes:
+            for replica in range(replicas):
+                self._ring[self._hash(f"{node}:{replica}")] = node
+        self._keys = sorted(self._ring)
+
+    @staticmethod
+    def _hash(key: Any) -> int:
+        return int(hashlib.md5(str(key).encode()).hexdigest()[:8], 16)
+
+    def get_node(self, key: Any) -> int:
+        """Возвращает узел, отвечающий за ключ"""
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[self._keys[index]]
+
+
+def worker_main(worker_id: int, queue: multiprocessing.Queue) -> None:
+    """Точка входа рабочего процесса"""
+    # Ctrl+C получает вся группа процессов - останавливает нас супервизор.
+    # Обработчики сигналов и wakeup fd унаследованы от цикла событий супервизора
+    # при fork - сбрасываем их, чтобы сигналы процесса не доходили до родителя
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        asyncio.run(run_worker(worker_id, queue))
+    except Exception as e:
+        logger.error(f"Рабочий процесс {worker_id} завершился с ошибкой: {e}")
+        logger.error(f"Трассировка: {traceback.format_exc()}")
+        sys.exit(1)
+
+
+async def run_worker(worker_id: int, queue: multiprocessing.Queue) -> None:
+    """Обрабатывает события из очереди супервизора со своим графом ServiceFactory"""
+    bot = VKinderBot(mode='worker')
+    await bot.startup()
+    logger.info(f"👷 Рабочий процесс {worker_id} готов")
+
+    loop = asyncio.get_running_loop()
+    try:
+        while bot.is_running:
+            event = await loop.run_in_executor(None, queue.get)
+            if event is None:
+                break
+            # Через ingest: двойные нажатия отсекаются здесь, где известно,
+            # обработано ли предыдущее нажатие
+            bot.ingest(event)
+    finally:
+        await bot.shutdown()
+
+
+class Supervisor:
+    """Запускает рабочие процессы и маршрутизирует им события"""
+
+    def __init__(self, workers: int, mode: str = None):
+        self.workers = workers
+        self.mode = mode or config.BOT.MODE
+        self.is_running = False
+        self.stop_event = asyncio.Event()
+        self.stopped = asyncio.Event()
+
+        # fork позволяет разделить уже загруженные модули; на Windows доступен только spawn
+        method = 'spawn' if IS_WINDOWS else 'fork'
+        self.context = multiprocessing.get_context(method)
+
+        self.queues = [self.context.Queue() for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.ring = ConsistentHashRing(list(range(workers)))
+        self.restarts = 0
+
+        # Рабочие процессы делят лимиты токенов VK через файлы
+        if config.VK.RATE_LIMIT_BACKEND == 'auto' and not IS_WINDOWS:
+            config.VK.RATE_LIMIT_BACKEND = 'file'
+
+        self.deduplicator = EventDeduplicator(
+            event_window=config.BOT.DEDUP_WINDOW,
+            payload_window=config.BOT.PAYLOAD_DEDUP_WINDOW
+        )
+        self.longpoll = None
+        self.callback_server = None
+
+    def _start_worker(self, worker_id: int) -> None:
+        """Запускает (или перезапускает) рабочий процесс"""
+        process = self.context.Process(
+            target=worker_main,
+            args=(worker_id, self.queues[worker_id]),
+            name=f"vkinder-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self.processes[worker_id] = process
+        logger.info(f"Запущен рабочий процесс {worker_id} (pid {process.pid})")
+
+    def route(self, event: Dict[str, Any]) -> bool:
+        """Передает событие рабочему процессу, отвечающему за пользователя"""
+        # Двойные нажатия отсекает рабочий процесс: только он знает,
+        # обработано ли предыдущее нажатие
+        if self.deduplicator.is_redelivery(event):
+            return False
+        worker_id = self.ring.get_node(get_event_user_id(event))
+        self.queues[worker_id].put_nowait(event)
+        return True
+
+    async def monitor(self) -> None:
+        """Перезапускает упавшие рабочие процессы"""
+        while self.is_running:
+            await asyncio.sleep(1)
+            for worker_id, process in enumerate(self.processes):
+                if self.is_running and process is not None and not process.is_alive():
+                    logger.warning(
+                        f"Рабочий процесс {worker_id} (pid {process.pid}) завершился "
+                        f"с кодом {process.exitcode}, перезапускаем"
+                    )
+                    self.restarts += 1
+                    self._start_worker(worker_id)
+
+    async def run(self) -> None:
+        """Запускает рабочие процессы и прием событий"""
+        # Всё, что загружено до fork, исключаем из сборки мусора - иначе
+        # обход объектов сборщиком копирует общие страницы в каждый процесс
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+        self.is_running = True
+        for worker_id in range(self.workers):
+            self._start_worker(worker_id)
+
+        if not IS_WINDOWS:
+            loop = asyncio.get_running_loop()
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                loop.add_signal_handler(sig, lambda: asyncio.create_task(self.shutdown()))
+
+        monitor_task = asyncio.create_task(self.monitor())
+        try:
+            if self.mode == 'callback':
+                self.callback_server = CallbackServer(self.route)
+                await self.callback_server.start()
+                await self.stop_event.wait()
+            else:
+                self.longpoll = LongPollService(config.VK.GROUP_TOKEN, config.VK.GROUP_ID)
+                async for event in self.longpoll.listen():
+                    self.route(event)
+                    if not self.is_running:
+                        break
+        finally:
+            monitor_task.cancel()
+            if self.is_running:
+                await self.shutdown()
+            else:
+                # Остановка запущена обработчиком сигнала - дожидаемся ее
+                await self.stopped.wait()
+
+    async def shutdown(self, timeout: float = None) -> None:
+        """Останавливает прием событий и рабочие процессы"""
+        if not self.is_running:
+            return
+        logger.info("🛑 Остановка супервизора...")
+        self.is_running = False
+        self.stop_event.set()
+
+        if self.longpoll:
+            await self.longpoll.close()
+        if self.callback_server:
+            await self.callback_server.stop()
+
+        # Сигнал завершения идет в очередь после уже переданных событий
+        for queue in self.queues:
+            queue.put(None)
+
+        # Рабочим процессам нужно время на собственную остановку с ожиданием событий
+        if timeout is None:
+            timeout = config.BOT.SHUTDOWN_TIMEOUT + 5
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Рабочий процесс pid {process.pid} не завершился, прерываем")
+                process.terminate()
+
+        logger.info(f"👋 Супервизор остановлен, перезапусков рабочих процессов: {self.restarts}")
+        self.stopped.set()
+
+
+def main() -> None:
+    """Точка входа многопроцессного режима"""
+    parser = argparse.ArgumentParser(description="VKinder Bot: многопроцессный режим")
+    parser.add_argument('--workers', type=int, default=config.BOT.WORKERS,
+                        help="количество рабочих процессов")
+    parser.add_argument('--mode', choices=['longpoll', 'callback'], default=None,
+                        help="способ получения событий (по умолчанию BOT_MODE)")
+    args = parser.parse_args()
+
+    async def run():
+        await Supervisor(args.workers, args.mode).run()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n🛑 Бот остановлен пользователем")
+
+
+if __name__ == "__main__":
+    main()
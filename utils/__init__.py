@@ -24,6 +24,11 @@ from .helpers import (
     dataclass_to_dict,
     format_timedelta,
     RateLimiter,
+    TimeBucketedSet,
+    TTLCache,
+    MicroBatcher,
+    SingleFlight,
+    AdaptiveConcurrencyLimiter,
     DatabaseConnectionPool,
     setup_logging,
     with_error_handling,
@@ -35,6 +40,13 @@ from .helpers import (
 )
 
 from .data_models import UserState, StateData  # Добавляем импорт моделей
+from .event_recorder import EventRecorder, read_records
+from .rate_limit import (
+    RateLimitBackend,
+    FileRateLimitBackend,
+    SharedRateLimiter,
+    create_rate_limit_backend,
+)
 
 __all__ = [
     'VKinderError',
@@ -58,12 +70,23 @@ __all__ = [
     'dataclass_to_dict',
     'format_timedelta',
     'RateLimiter',
+    'TimeBucketedSet',
+    'TTLCache',
+    'MicroBatcher',
+    'SingleFlight',
+    'AdaptiveConcurrencyLimiter',
     'DatabaseConnectionPool',
     'setup_logging',
     'with_error_handling',
     'recover_user_state',
     'UserState',  # Добавляем
     'StateData',  # Добавляем
+    'EventRecorder',
+    'read_records',
+    'RateLimitBackend',
+    'FileRateLimitBackend',
+    'SharedRateLimiter',
+    'create_rate_limit_backend',
     'validate_vk_id',
     'format_profile',
     'format_favorites',
@@ -0,0 +1,75 @@
+"""
+Запись входящих событий и вызовов VK API в JSONL для воспроизведения
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventRecorder:
+    """
+    Пишет по одной JSON-записи на строку:
+    {"type": "event", "t": 1.25, "event": {...}} - сырое событие long poll / Callback API;
+    {"type": "api", "t": 1.31, "method": "users.search", "params": {...},
+     "latency": 0.15, "error": null, "response": {...}} - вызов VK API.
+    t - секунды от начала записи.
+    """
+
+    def __init__(self, path: str, record_responses: bool = False, flush_every: int = 100):
+        self.path = path
+        self.record_responses = record_responses
+        self.flush_every = flush_every
+
+        self._file = open(path, 'a', encoding='utf-8')
+        self._started = time.monotonic()
+        self._unflushed = 0
+        logger.info(f"Запись событий в {path}")
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            return
+        record['t'] = round(time.monotonic() - self._started, 4)
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self._file.flush()
+            self._unflushed = 0
+
+    def record_event(self, event: Dict[str, Any]) -> None:
+        """Записывает сырое входящее событие"""
+        self._write({'type': 'event', 'event': event})
+
+    def record_api_call(self, method: str, params: Dict[str, Any], latency: float,
+                        response: Any = None, error: Optional[str] = None) -> None:
+        """Записывает вызов VK API (ответ - только если включено record_responses)"""
+        self._write({
+            'type': 'api',
+            'method': method,
+            'params': params,
+            'latency': round(latency, 4),
+            'error': error,
+            'response': response if self.record_responses else None
+        })
+
+    def close(self) -> None:
+        """Сбрасывает буфер и закрывает файл"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Читает записи EventRecorder из JSONL-файла, пропуская пустые строки"""
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"{path}:{line_no}: некорректная запись пропущена ({e})")
@@ -6,7 +6,9 @@ import logging
 import re
 import json
 import asyncio
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
 from datetime import datetime, timedelta
 from functools import wraps
 import aiohttp
@@ -23,8 +25,16 @@ class VKinderError(Exception):
 
 
 class VKAPIError(VKinderError):
-    """Ошибка API ВКонтакте"""
-    pass
+    """
+    Ошибка API ВКонтакте.
+    code - error_code из ответа VK (None для сетевых ошибок и таймаутов),
+    status - HTTP-статус, если сервер ответил не 200
+    """
+
+    def __init__(self, message: str = '', code: Optional[int] = None, status: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+        self.status = status
 
 
 class DatabaseError(VKinderError):
@@ -272,7 +282,7 @@ async def safe_json_request(url: str, params: Dict[str, Any],
             data = await response.json()
             if 'error' in data:
                 error_msg = data['error'].get('error_msg', 'Unknown VK error')
-                raise VKAPIError(f"VK API error: {error_msg}")
+                raise VKAPIError(f"VK API error: {error_msg}", data['error'].get('error_code'))
 
             return data
 
@@ -325,34 +335,369 @@ def format_timedelta(delta: timedelta) -> str:
         return f"{seconds}с"
 
 
+class TimeBucketedSet:
+    """
+    Множество ключей с ограниченным временем жизни.
+
+    Ключи складываются в корзины по bucket_seconds; корзины старше окна
+    удаляются целиком, поэтому очистка стоит O(1) на корзину, а память
+    ограничена окном и max_items.
+    """
+    def __init__(self, window: float, buckets: int = 10, max_items: int = 100000):
+        self.window = window
+        self.bucket_seconds = window / buckets
+        self.max_items = max_items
+        self._buckets = deque()  # (номер корзины, set)
+        self._size = 0
+
+    def _expire(self, now: float) -> None:
+        """Удаляет корзины, вышедшие за окно, и лишние при переполнении"""
+        oldest_allowed = int((now - self.window) / self.bucket_seconds)
+        while self._buckets and (self._buckets[0][0] < oldest_allowed or self._size > self.max_items):
+            _, keys = self._buckets.popleft()
+            self._size -= len(keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        self._expire(time.monotonic())
+        return any(key in keys for _, keys in self._buckets)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: Hashable) -> bool:
+        """Добавляет ключ; возвращает False, если он уже был в окне"""
+        now = time.monotonic()
+        self._expire(now)
+        if any(key in keys for _, keys in self._buckets):
+            return False
+
+        bucket_no = int(now / self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != bucket_no:
+            self._buckets.append((bucket_no, set()))
+        self._buckets[-1][1].add(key)
+        self._size += 1
+        return True
+
+
+class TTLCache:
+    """
+    Словарь с временем жизни записей и вытеснением давно использованных
+    при превышении max_items
+    """
+    def __init__(self, ttl: float, max_items: int = 10000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items = OrderedDict()  # ключ -> (время истечения, значение)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._items[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        marker = object()
+        return self.get(key, marker) is not marker
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class MicroBatcher:
+    """
+    Объединяет запросы отдельных ключей в пакетные.
+
+    Ключи, запрошенные в течение window секунд, передаются одним вызовом
+    fetch(keys) -> {ключ: значение}; каждый ожидающий получает свое значение
+    (None, если ключа нет в ответе) или исключение fetch. Пачка уходит сразу,
+    как только набралось max_batch разных ключей.
+    """
+    def __init__(self, fetch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 window: float = 0.02, max_batch: int = 1000):
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+
+        self._pending: Dict[Hashable, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self.requested = 0
+        self.batches = 0
+
+    async def get(self, key: Hashable) -> Any:
+        """Возвращает значение ключа из ближайшей пачки"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        self.requested += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self.batches += 1
+        task = asyncio.ensure_future(self._run(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: Dict[Hashable, List[asyncio.Future]]) -> None:
+        try:
+            results = await self.fetch(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    # Отмененные ожидающие (cancel) уже done - их пропускаем
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key, futures in pending.items():
+            value = results.get(key)
+            for future in futures:
+                if not future.done():
+                    future.set_result(value)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Сколько ключей запрошено и сколькими пачками"""
+        return {
+            'requested': self.requested,
+            'batches': self.batches,
+            'avg_batch': self.requested / self.batches if self.batches else 0.0
+        }
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые запросы: пока запрос с ключом
+    выполняется, остальные вызовы с тем же ключом ждут его результат
+    (один и тот же объект - изменять его нельзя).
+
+    Запрос выполняется отдельной задачей: отмена одного из ожидающих не
+    отменяет его для остальных, а когда ждать перестали все - запрос
+    отменяется.
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def _finished(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Результат, который никто не дождался, не должен давать предупреждение
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет factory() или присоединяется к уже идущему запросу с тем же ключом"""
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(factory()))
+            flight.task.add_done_callback(lambda _: self._finished(key, flight))
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Все ожидающие отменены - новые вызовы начнут запрос заново
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Сколько вызовов получили результат чужого запроса"""
+        return {
+            'calls': self.calls,
+            'shared': self.shared,
+            'ratio': self.shared / self.calls if self.calls else 0.0
+        }
+
+
 class RateLimiter:
     """
-    Класс для ограничения частоты запросов
+    Ограничение частоты запросов: не больше max_requests за period секунд
+    (GCRA - алгоритм «теоретического времени прихода», вариант token bucket).
+
+    acquire выполняется за O(1) по монотонным часам: вызов сразу бронирует
+    свой слот и спит вне всякой блокировки, поэтому ожидающие проходят
+    в порядке вызова. burst - сколько запросов можно выполнить подряд
+    без интервала после простоя.
     """
-    def __init__(self, max_requests: int, period: float):
+    def __init__(self, max_requests: float, period: float = 1.0, burst: int = 1):
         self.max_requests = max_requests
         self.period = period
-        self.requests = []
-        self.lock = asyncio.Lock()
+        self.burst = max(1, burst)
+        self.interval = period / max_requests
+        self._tolerance = (self.burst - 1) * self.interval
+        self._tat = 0.0  # теоретическое время прихода следующего запроса
+
+        self.acquired = 0
+        self.delayed = 0
+        self.waited = 0.0
+
+    def reserve(self) -> float:
+        """Бронирует слот и возвращает, сколько секунд до него ждать"""
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        self._tat = tat + self.interval
+        self.acquired += 1
+        return max(0.0, tat - self._tolerance - now)
 
     async def acquire(self):
         """Получает разрешение на выполнение запроса"""
-        async with self.lock:
-            now = datetime.now()
+        delay = self.reserve()
+        if delay <= 0:
+            return
+        reserved = self._tat
 
-            self.requests = [req_time for req_time in self.requests
-                             if (now - req_time).total_seconds() < self.period]
+        self.delayed += 1
+        self.waited += delay
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # Возвращаем слот, если после нас никто не успел забронировать
+            if self._tat == reserved:
+                self._tat -= self.interval
+            raise
 
-            if len(self.requests) >= self.max_requests:
-                oldest_request = self.requests[0]
-                wait_time = self.period - (now - oldest_request).total_seconds()
-                await asyncio.sleep(wait_time)
+    async def penalize(self, seconds: float):
+        """Не выдавать разрешений ближайшие seconds секунд (VK ответил, что лимит превышен)"""
+        self._tat = max(self._tat, time.monotonic() + seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Число разрешений, из них с ожиданием, и суммарное ожидание (сек.)"""
+        return {
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'waited': round(self.waited, 3)
+        }
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Ограничение числа одновременных вызовов, подстраивающееся под ответы
+    сервера (AIMD): пока задержки обычные, лимит растет примерно на 1 за
+    каждые limit успешных вызовов; при перегрузке (ошибка лимита, таймаут или
+    задержка больше spike_factor средней) лимит уменьшается вдвое - не чаще
+    одного раза за среднее время ответа, чтобы одна волна медленных ответов
+    не обрушила его до минимума. Медленные ответы тоже входят в среднюю:
+    если задержки выросли насовсем, средняя догоняет их и лимит снова
+    растет. Ожидающие получают слоты по очереди.
+    """
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 spike_factor: float = 2.0, smoothing: float = 0.1, warmup: int = 10):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.spike_factor = spike_factor
+        self.smoothing = smoothing
+        self.warmup = warmup
+
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self.baseline: Optional[float] = None  # средняя задержка (EWMA), секунды
+        self._samples = 0
+        self._last_decrease = 0.0
+
+        self.increases = 0
+        self.decreases = 0
 
-                now = datetime.now()
-                self.requests = [req_time for req_time in self.requests
-                                 if (now - req_time).total_seconds() < self.period]
+    async def acquire(self):
+        """Занимает слот (ждет, пока число вызовов не станет меньше лимита)"""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан - возвращаем его следующему
+                self.in_flight -= 1
+                self._wake()
+            raise
 
-            self.requests.append(now)
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def release(self, latency: Optional[float] = None, overload: bool = False) -> None:
+        """
+        Освобождает слот. latency - время успешного вызова (секунды),
+        overload - вызов завершился признаком перегрузки
+        """
+        self.in_flight -= 1
+        if overload:
+            self._decrease()
+        elif latency is not None:
+            spike = (self._samples >= self.warmup and self.baseline
+                     and latency > self.spike_factor * self.baseline)
+            self._samples += 1
+            self.baseline = latency if self.baseline is None else (
+                self.baseline + self.smoothing * (latency - self.baseline)
+            )
+            if spike:
+                self._decrease()
+            elif self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.increases += 1
+        self._wake()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.baseline or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2)
+        self.decreases += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'waiting': len(self._waiters),
+            'latency': round(self.baseline, 3) if self.baseline is not None else None,
+            'decreases': self.decreases
+        }
 
 
 class DatabaseConnectionPool:
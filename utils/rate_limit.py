@@ -0,0 +1,184 @@
+"""
+Ограничение частоты запросов, общее для нескольких процессов
+"""
+
+import abc
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Теоретическое время прихода (monotonic), monotonic и time.time() в момент записи
+_STATE = struct.Struct('ddd')
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Хранилище состояния GCRA (теоретического времени прихода) по ключам.
+
+    reserve атомарно бронирует следующий слот ключа и возвращает, сколько
+    секунд до него ждать; hold откладывает следующий слот не меньше чем на
+    seconds от текущего момента. Сетевое хранилище (например, Redis со
+    скриптами GCRA) реализует эти же методы, используя часы сервера.
+    """
+
+    @abc.abstractmethod
+    async def reserve(self, key: str, interval: float, tolerance: float) -> float:
+        """Бронирует слот длиной interval; возвращает ожидание до него (сек.)"""
+
+    @abc.abstractmethod
+    async def hold(self, key: str, seconds: float) -> None:
+        """Теоретическое время прихода - не раньше чем через seconds секунд"""
+
+    def close(self) -> None:
+        pass
+
+
+class FileRateLimitBackend(RateLimitBackend):
+    """
+    Состояние в файлах под flock: общее для всех процессов хоста.
+
+    На каждый ключ - файл из 24 байт. Часы monotonic общие для процессов
+    одной машины; после перезагрузки сохраненное время не имеет смысла,
+    это видно по расхождению monotonic и time.time() - тогда состояние
+    сбрасывается.
+
+    flock не разделяет потоки одного процесса (блокировка на открытый файл,
+    а файл ключа открыт один раз), поэтому потоки дополнительно
+    выстраиваются в очередь на threading.Lock ключа.
+    """
+
+    def __init__(self, directory: str):
+        if fcntl is None:
+            raise RuntimeError("FileRateLimitBackend требует fcntl (недоступен на Windows)")
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._fds: Dict[str, int] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _fd(self, key: str) -> int:
+        fd = self._fds.get(key)
+        if fd is None:
+            name = hashlib.sha1(key.encode()).hexdigest()[:20]
+            fd = self._fds[key] = os.open(
+                os.path.join(self.directory, name), os.O_RDWR | os.O_CREAT, 0o600
+            )
+        return fd
+
+    def _update(self, key: str, update: Callable[[float, float], float]) -> Tuple[float, float]:
+        """
+        Под блокировкой заменяет теоретическое время прихода tat на
+        update(tat, now); возвращает прежнее tat (не раньше now) и now
+        """
+        with self._lock(key):
+            fd = self._fd(key)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                now, wall_now = time.monotonic(), time.time()
+                data = os.pread(fd, _STATE.size, 0)
+                tat = 0.0
+                if len(data) == _STATE.size:
+                    tat, written, wall_written = _STATE.unpack(data)
+                    if abs((now - written) - (wall_now - wall_written)) > 1.0:
+                        tat = 0.0  # другие часы monotonic - была перезагрузка
+                tat = max(tat, now)
+                os.pwrite(fd, _STATE.pack(update(tat, now), now, wall_now), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return tat, now
+
+    def reserve_sync(self, key: str, interval: float, tolerance: float) -> float:
+        tat, now = self._update(key, lambda tat, now: tat + interval)
+        return max(0.0, tat - tolerance - now)
+
+    def hold_sync(self, key: str, seconds: float) -> None:
+        self._update(key, lambda tat, now: max(tat, now + seconds))
+
+    async def reserve(self, key: str, interval: float, tolerance: float) -> float:
+        # flock может ждать другой процесс - не блокируем цикл событий
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.reserve_sync, key, interval, tolerance
+        )
+
+    async def hold(self, key: str, seconds: float) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.hold_sync, key, seconds)
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+def create_rate_limit_backend(name: str, directory: str = '') -> Optional[RateLimitBackend]:
+    """
+    Хранилище лимитов по имени: file - общее для процессов хоста,
+    local и auto - None (RateLimiter в памяти процесса). supervisor.py
+    заменяет auto на file для своих рабочих процессов
+    """
+    if name == 'auto':
+        name = 'local'
+    if name == 'file':
+        return FileRateLimitBackend(directory or os.path.join(tempfile.gettempdir(), 'vkinder-ratelimit'))
+    if name != 'local':
+        logger.warning(f"Неизвестное хранилище лимитов '{name}', используется local")
+    return None
+
+
+class SharedRateLimiter:
+    """
+    RateLimiter, состояние которого хранится в backend под ключом key:
+    лимит делят все процессы, использующие тот же backend и ключ
+    """
+
+    def __init__(self, backend: RateLimitBackend, key: str, max_requests: float,
+                 period: float = 1.0, burst: int = 1):
+        self.backend = backend
+        self.key = key
+        self.interval = period / max_requests
+        self._tolerance = (max(1, burst) - 1) * self.interval
+
+        self.acquired = 0
+        self.delayed = 0
+        self.waited = 0.0
+
+    async def acquire(self):
+        """Получает разрешение на выполнение запроса"""
+        delay = await self.backend.reserve(self.key, self.interval, self._tolerance)
+        self.acquired += 1
+        if delay > 0:
+            # Слот уже учтен другими процессами - при отмене его не вернуть
+            self.delayed += 1
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    async def penalize(self, seconds: float):
+        """Не выдавать разрешений ближайшие seconds секунд - всем процессам"""
+        # Как RateLimiter.penalize: одновременные ошибки не складываются
+        await self.backend.hold(self.key, seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'waited': round(self.waited, 3)
+        }